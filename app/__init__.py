@@ -1 +1,4 @@
 # BYB AI Application
+
+# Submodules making up the package; nothing is imported eagerly, so importing `app` stays cheap
+__all__ = ["auth", "config", "exceptions", "main", "models", "services"]
@@ -0,0 +1,119 @@
+"""API key authentication middleware."""
+import hashlib
+from typing import AbstractSet, Any, Dict, Iterable, Optional, Tuple
+
+from fastapi.responses import ORJSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+API_KEY_HEADER = b"x-api-key"
+
+# Name of the X-API-Key security scheme in the OpenAPI document
+API_KEY_SCHEME_NAME = "APIKeyHeader"
+
+
+def hash_api_key(api_key: bytes) -> bytes:
+    """Hash an API key for comparison against the configured keys."""
+    return hashlib.sha256(api_key).digest()
+
+
+def build_key_hashes(api_keys: Iterable[Optional[str]]) -> frozenset:
+    """
+    Hash the configured API keys once at startup.
+    
+    Args:
+        api_keys: Configured keys; empty values are ignored
+        
+    Returns:
+        Set of SHA-256 digests of the accepted keys
+    """
+    return frozenset(hash_api_key(key.encode("utf-8")) for key in api_keys if key)
+
+
+def add_api_key_security(openapi_schema: Dict[str, Any], public_paths: Iterable[str] = ()) -> Dict[str, Any]:
+    """
+    Document the X-API-Key scheme in an OpenAPI schema, enabling "Authorize" in /docs.
+    
+    Only the schema is changed; keys are checked by APIKeyMiddleware, so routes need no
+    security dependency resolved on every request.
+    
+    Args:
+        openapi_schema: Generated OpenAPI schema, modified in place
+        public_paths: Paths served without authentication
+        
+    Returns:
+        The same schema
+    """
+    components = openapi_schema.setdefault("components", {})
+    components.setdefault("securitySchemes", {})[API_KEY_SCHEME_NAME] = {
+        "type": "apiKey",
+        "in": "header",
+        "name": "X-API-Key"
+    }
+    
+    public_paths = frozenset(public_paths)
+    for path, operations in openapi_schema.get("paths", {}).items():
+        if path in public_paths:
+            continue
+        for operation in operations.values():
+            operation["security"] = [{API_KEY_SCHEME_NAME: []}]
+    
+    return openapi_schema
+
+
+class APIKeyMiddleware:
+    """
+    ASGI middleware that rejects requests without a valid X-API-Key header.
+    
+    Runs before routing, so protected endpoints don't need an auth dependency.
+    """
+    
+    def __init__(self, app: ASGIApp, key_hashes: AbstractSet[bytes], public_paths: Iterable[str] = ()):
+        """
+        Initialize the middleware.
+        
+        Args:
+            app: Wrapped ASGI application
+            key_hashes: SHA-256 digests of the accepted API keys
+            public_paths: Paths served without authentication
+        """
+        self.app = app
+        self.key_hashes = key_hashes
+        self.public_paths = frozenset(public_paths)
+    
+    def _check(self, api_key: Optional[bytes]) -> Optional[Tuple[int, str]]:
+        """
+        Check an API key.
+        
+        Returns:
+            Tuple of (status code, detail) if the request must be rejected, None otherwise
+        """
+        if not self.key_hashes:
+            return 500, "API key not configured on server. Please contact administrator."
+        
+        if not api_key:
+            return 401, "API key is required. Please provide X-API-Key header."
+        
+        if hash_api_key(api_key) not in self.key_hashes:
+            return 403, "Invalid API key"
+        
+        return None
+    
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["path"] in self.public_paths:
+            await self.app(scope, receive, send)
+            return
+        
+        api_key = None
+        for name, value in scope["headers"]:
+            if name == API_KEY_HEADER:
+                api_key = value
+                break
+        
+        error = self._check(api_key)
+        if error:
+            status_code, detail = error
+            response = ORJSONResponse(status_code=status_code, content={"detail": detail})
+            await response(scope, receive, send)
+            return
+        
+        await self.app(scope, receive, send)
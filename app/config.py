@@ -1,7 +1,8 @@
 """Application configuration settings."""
 import os
+from functools import lru_cache
 from pathlib import Path
-from typing import Optional
+from typing import List, Optional
 
 from pydantic_settings import BaseSettings
 
@@ -20,14 +21,41 @@ class Settings(BaseSettings):
     
     langextract_api_key: Optional[str] = None
     ner_model_name: str = "gemini-flash-lite-latest"
+    ner_batch_size: int = 8  # Concurrent requests coalesced per LangExtract call; 1 disables batching
+    ner_batch_max_wait_ms: float = 20.0
     
     # API Key Authentication
     api_key: Optional[str] = None
+    api_keys: List[str] = []  # Additional accepted keys, e.g. during rotation
     
     # Upload Service Configuration
     upload_service_url: Optional[str] = None
     upload_service_api_key: Optional[str] = None
     upload_service_timeout: float = 300.0  # 5 minutes default timeout
+    upload_service_multipart: bool = False  # Send raw bytes as multipart/form-data instead of base64 JSON
+    upload_service_gzip: bool = False  # gzip the JSON body; the service must accept Content-Encoding: gzip
+    upload_service_http2: bool = False  # Multiplex concurrent uploads over one HTTP/2 connection
+    upload_max_concurrency: int = 16  # Uploads in flight per upload_many call
+    upload_background_workers: int = 4  # Workers sending uploads queued with schedule_upload; 0 disables the queue
+    upload_retry_attempts: int = 3  # Attempts per upload on connection errors, 429 and 5xx
+    upload_retry_backoff_seconds: float = 1.0  # Doubled after each failed attempt
+    
+    # Shared outbound HTTP connection pool
+    http_max_connections: int = 100
+    http_max_keepalive_connections: int = 50
+    
+    # Document Upload Configuration
+    max_upload_size_bytes: int = 50 * 1024 * 1024  # 50 MB
+    upload_read_chunk_size: int = 1024 * 1024  # 1 MB
+    
+    # OCR Configuration
+    ocr_page_concurrency: int = 8  # Concurrent inline Vision page requests across all PDFs
+    ocr_parallel_max_pages: int = 50  # Larger PDFs use the GCS batch operation
+    ocr_max_pdf_pages: int = 2000  # Vision's limit for async PDF annotation
+    
+    # Document Cache Configuration
+    document_cache_max_entries: int = 256  # 0 disables caching
+    document_cache_ttl_seconds: float = 3600.0
     
     # Blockchain Configuration
     blockchain_rpc_url: Optional[str] = None
@@ -44,5 +72,18 @@ class Settings(BaseSettings):
         extra = "ignore"  
 
 
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    """
+    Get the application settings, reading the environment and .env file only once.
+    
+    Usable as a FastAPI dependency.
+    
+    Returns:
+        Cached Settings instance
+    """
+    return Settings()
+
+
 # Global settings instance
-settings = Settings()
+settings = get_settings()
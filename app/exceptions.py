@@ -0,0 +1,9 @@
+"""Application exception types."""
+
+
+class DocumentProcessingError(RuntimeError):
+    """Raised when a document cannot be processed by the OCR/NER pipeline."""
+
+
+class InvalidDocumentError(DocumentProcessingError):
+    """Raised when an uploaded document is malformed or outside the supported limits."""
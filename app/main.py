@@ -2,13 +2,17 @@
 Main FastAPI application for BYB AI.
 """
 
-from typing import Dict, Any, Optional
-from fastapi import FastAPI, File, UploadFile, HTTPException, Body, Security, Header
-from fastapi.security import APIKeyHeader
-from pydantic import BaseModel
-import base64
-import secrets
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Any, List, Optional, Tuple
+from fastapi import FastAPI, File, UploadFile, HTTPException, Body, Header, Depends, Request, Query
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import JSONResponse, ORJSONResponse, Response
+from pydantic import BaseModel, ConfigDict
+import asyncio
+import io
 import logging
+import httpx
+import orjson
 
 # Configure logging
 logging.basicConfig(
@@ -23,88 +27,222 @@ logging.basicConfig(
 logging.getLogger("app.services.upload_service").setLevel(logging.DEBUG)
 logging.getLogger("httpx").setLevel(logging.WARNING)  # Reduce httpx noise
 
+from app.auth import APIKeyMiddleware, add_api_key_security, build_key_hashes
 from app.services.ocr_service import OCRService
 from app.services.ner_service import NERService
 from app.services.validation_service import ValidationService
 from app.services.upload_service import UploadService
 from app.services.blockchain_service import BlockchainService
+from app.services.cache_service import ResultCache, content_hash, new_content_hasher
 from app.models import ExtractionResult
 from app.config import settings
+from app.exceptions import InvalidDocumentError
+
+
+async def create_blockchain_service() -> Optional[BlockchainService]:
+    """
+    Create the blockchain service if the integration is enabled and configured.
+    
+    Returns:
+        BlockchainService instance, or None if disabled or initialization failed
+    """
+    if not (settings.blockchain_enabled and settings.blockchain_rpc_url and settings.escrow_contract_address):
+        logging.info("Blockchain integration is disabled")
+        return None
+    
+    try:
+        blockchain_service = BlockchainService(
+            rpc_url=settings.blockchain_rpc_url,
+            contract_address=settings.escrow_contract_address,
+            abi_file_path="contracts/EscrowManager.json",
+            private_key=settings.oracle_private_key,
+            chain_id=settings.blockchain_chain_id,
+            max_connections=settings.http_max_connections
+        )
+        await blockchain_service.connect()
+        logging.info(f"Blockchain service initialized. Oracle address: {blockchain_service.get_oracle_address()}")
+        return blockchain_service
+    except Exception as e:
+        logging.error(f"Failed to initialize blockchain service: {e}")
+        return None
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    """
+    Create the application services once per worker and share them across requests.
+    
+    Args:
+        app: FastAPI application whose state holds the services
+    """
+    http_client = httpx.AsyncClient(
+        http2=settings.upload_service_http2,
+        limits=httpx.Limits(
+            max_connections=settings.http_max_connections,
+            max_keepalive_connections=settings.http_max_keepalive_connections
+        )
+    )
+    
+    app.state.ocr_service = OCRService()
+    app.state.ner_service = NERService()
+    app.state.validation_service = ValidationService()
+    app.state.upload_service = UploadService(http_client=http_client)
+    app.state.blockchain_service = await create_blockchain_service()
+    
+    await app.state.ner_service.start()
+    await app.state.upload_service.start()
+    
+    try:
+        yield
+    finally:
+        await app.state.ner_service.stop()
+        await app.state.upload_service.stop()
+        await app.state.upload_service.aclose()
+        if app.state.blockchain_service:
+            await app.state.blockchain_service.close()
+        await http_client.aclose()
+
 
 app = FastAPI(
     title="BYB AI API",
     description="REST API for BYB AI application",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
+)
+
+# Paths served without an API key
+PUBLIC_PATHS = ["/", "/health", "/docs", "/docs/oauth2-redirect", "/redoc", "/openapi.json"]
+
+app.add_middleware(
+    APIKeyMiddleware,
+    key_hashes=build_key_hashes([settings.api_key, *settings.api_keys]),
+    public_paths=PUBLIC_PATHS
 )
+app.add_middleware(GZipMiddleware, minimum_size=1024, compresslevel=5)
+
+
+def openapi() -> Dict[str, Any]:
+    """Generate the OpenAPI schema once, documenting the API key checked by APIKeyMiddleware."""
+    if app.openapi_schema is None:
+        add_api_key_security(FastAPI.openapi(app), PUBLIC_PATHS)
+    return app.openapi_schema
+
+
+app.openapi = openapi
+
+
+@app.exception_handler(InvalidDocumentError)
+async def invalid_document_error_handler(request: Request, exc: InvalidDocumentError) -> ORJSONResponse:
+    """Translate rejected documents into 400 responses."""
+    return ORJSONResponse(status_code=400, content={"detail": str(exc)})
+
+
+@app.exception_handler(RuntimeError)
+async def runtime_error_handler(request: Request, exc: RuntimeError) -> ORJSONResponse:
+    """Translate service failures (including DocumentProcessingError) into 500 responses."""
+    return ORJSONResponse(status_code=500, content={"detail": str(exc)})
 
-api_key_header = APIKeyHeader(name="X-API-Key", auto_error=False)
 
+@app.exception_handler(Exception)
+async def unhandled_error_handler(request: Request, exc: Exception) -> ORJSONResponse:
+    """Translate unexpected failures into 500 responses."""
+    return ORJSONResponse(status_code=500, content={"detail": f"Failed to process document: {str(exc)}"})
 
-def verify_api_key(x_api_key: str = Security(api_key_header)) -> str:
+
+def get_ocr_service(request: Request) -> OCRService:
+    """Get the shared OCR service."""
+    return request.app.state.ocr_service
+
+
+def get_ner_service(request: Request) -> NERService:
+    """Get the shared NER service."""
+    return request.app.state.ner_service
+
+
+def get_validation_service(request: Request) -> ValidationService:
+    """Get the shared validation service."""
+    return request.app.state.validation_service
+
+
+def get_upload_service(request: Request) -> UploadService:
+    """Get the shared upload service."""
+    return request.app.state.upload_service
+
+
+def get_blockchain_service(request: Request) -> Optional[BlockchainService]:
+    """Get the shared blockchain service, or None if the integration is disabled."""
+    return request.app.state.blockchain_service
+
+
+# OCR text keyed by document hash, extraction keyed by OCR text hash
+ocr_cache: ResultCache[str] = ResultCache(
+    "OCR",
+    max_entries=settings.document_cache_max_entries,
+    ttl_seconds=settings.document_cache_ttl_seconds
+)
+ner_cache: ResultCache[ExtractionResult] = ResultCache(
+    "NER",
+    max_entries=settings.document_cache_max_entries,
+    ttl_seconds=settings.document_cache_ttl_seconds
+)
+
+
+async def read_document(chunks: AsyncIterator[bytes]) -> Tuple[bytes, str]:
     """
-    Verify API key from request header.
+    Read a document from a stream of chunks, enforcing the upload size limit.
+    
+    The document hash is computed while reading so the content is only walked once.
     
     Args:
-        x_api_key: API key from X-API-Key header
+        chunks: Async iterator over the document bytes
         
     Returns:
-        The validated API key
+        Tuple of (document content, content hash)
         
     Raises:
-        HTTPException: If API key is missing or invalid
+        HTTPException: If the document is empty or larger than the configured limit
     """
-    if not settings.api_key:
-        raise HTTPException(
-            status_code=500,
-            detail="API key not configured on server. Please contact administrator."
-        )
+    # BytesIO grows one buffer in place and getvalue() hands it over without a copy,
+    # so peak memory stays about the size of the document
+    buffer = io.BytesIO()
+    total_size = 0
+    hasher = new_content_hasher()
     
-    if not x_api_key:
-        raise HTTPException(
-            status_code=401,
-            detail="API key is required. Please provide X-API-Key header."
-        )
+    async for chunk in chunks:
+        total_size += len(chunk)
+        if total_size > settings.max_upload_size_bytes:
+            raise HTTPException(
+                status_code=413,
+                detail=f"Uploaded file exceeds the maximum size of {settings.max_upload_size_bytes} bytes"
+            )
+        hasher.update(chunk)
+        buffer.write(chunk)
     
-    if not secrets.compare_digest(x_api_key, settings.api_key):
-        raise HTTPException(
-            status_code=403,
-            detail="Invalid API key"
-        )
+    if not total_size:
+        raise HTTPException(status_code=400, detail="Uploaded file is empty")
     
-    return x_api_key
-
+    return buffer.getvalue(), hasher.hexdigest()
 
-ocr_service = OCRService()
-ner_service = NERService()
-validation_service = ValidationService()
-upload_service = UploadService()
 
-# Initialize blockchain service if enabled
-blockchain_service: Optional[BlockchainService] = None
-if settings.blockchain_enabled and settings.blockchain_rpc_url and settings.escrow_contract_address:
-    try:
-        blockchain_service = BlockchainService(
-            rpc_url=settings.blockchain_rpc_url,
-            contract_address=settings.escrow_contract_address,
-            abi_file_path="contracts/EscrowManager.json",
-            private_key=settings.oracle_private_key,
-            chain_id=settings.blockchain_chain_id
-        )
-        logging.info(f"Blockchain service initialized. Oracle address: {blockchain_service.get_oracle_address()}")
-    except Exception as e:
-        logging.error(f"Failed to initialize blockchain service: {e}")
-else:
-    logging.info("Blockchain integration is disabled")
+async def iter_upload(file: UploadFile) -> AsyncIterator[bytes]:
+    """Iterate over an uploaded file in fixed-size chunks."""
+    while chunk := await file.read(settings.upload_read_chunk_size):
+        yield chunk
 
 
 class HealthResponse(BaseModel):
     """Health check response model."""
+    model_config = ConfigDict(extra="forbid", frozen=True)
+    
     status: str
     message: str
 
 
 class ValidationResponse(BaseModel):
     """Validation response model."""
+    model_config = ConfigDict(extra="forbid", frozen=True)
+    
     is_valid: bool
     extraction: ExtractionResult
     upload_response: Optional[Dict[str, Any]] = None
@@ -113,6 +251,8 @@ class ValidationResponse(BaseModel):
 
 class EscrowInfoResponse(BaseModel):
     """Response model for escrow information."""
+    model_config = ConfigDict(extra="forbid", frozen=True)
+    
     total_escrowed: int
     total_released: int
     last_released_milestone: int
@@ -120,26 +260,156 @@ class EscrowInfoResponse(BaseModel):
     developer: str
 
 
-@app.get("/health", response_model=HealthResponse, tags=["Health"])
-async def health_check() -> HealthResponse:
+# Upper bound on buildings per /blockchain/escrows call, keeping the multicall within gas limits
+MAX_ESCROW_LOOKUPS = 100
+
+
+# Health payload never changes, so serialize it once
+HEALTH_RESPONSE_BYTES = orjson.dumps(
+    HealthResponse(status="ok", message="BYB AI API is running").model_dump()
+)
+
+
+@app.get("/", response_class=Response, responses={200: {"model": HealthResponse}}, tags=["Health"])
+@app.get("/health", response_class=Response, responses={200: {"model": HealthResponse}}, tags=["Health"])
+async def health_check() -> Response:
     """
     Health check endpoint.
 
     Returns:
-        HealthResponse containing status and message indicating the API is healthy.
+        Pre-serialized HealthResponse containing status and message indicating the API is healthy.
     """
-    return HealthResponse(
-        status="ok",
-        message="BYB AI API is running"
-    )
+    return Response(content=HEALTH_RESPONSE_BYTES, media_type="application/json")
 
 
-@app.post("/validate", response_model=ValidationResponse, tags=["Validation"])
+async def upload_document(
+    upload_service: UploadService,
+    content: bytes,
+    filename: Optional[str]
+) -> Optional[Dict[str, Any]]:
+    """
+    Upload a validated document, printing a warning instead of failing on errors.
+    
+    Returns:
+        Upload service response, or None if the upload failed
+    """
+    try:
+        return await upload_service.upload_file(
+            file_content=content,
+            filename=filename
+        )
+    except RuntimeError as e:
+        print(f"Warning: Failed to upload file: {str(e)}")
+        return None
+
+
+async def release_milestone_funds(
+    blockchain_service: Optional[BlockchainService],
+    building_id: int
+) -> Optional[Dict[str, Any]]:
+    """
+    Release the next milestone funds on blockchain if enabled, printing a warning instead of failing on errors.
+    
+    Returns:
+        Transaction details, or None if blockchain is disabled or the release failed
+    """
+    if not blockchain_service:
+        return None
+    
+    try:
+        blockchain_response = await blockchain_service.release_milestone_funds(
+            building_id=building_id
+        )
+        print(f"Milestone funds released on blockchain: {blockchain_response['transaction_hash']}")
+        return blockchain_response
+    except Exception as e:
+        print(f"Warning: Failed to release milestone funds on blockchain: {str(e)}")
+        return None
+
+
+async def process_document(
+    content: bytes,
+    document_hash: str,
+    filename: Optional[str],
+    building_id: int,
+    ocr_service: OCRService,
+    ner_service: NERService,
+    validation_service: ValidationService,
+    upload_service: UploadService,
+    blockchain_service: Optional[BlockchainService],
+    background_upload: bool = False
+) -> ORJSONResponse:
+    """
+    Run the OCR, NER and validation pipeline on a document.
+    
+    Args:
+        content: Raw document bytes
+        document_hash: Content hash of the document
+        filename: Original filename
+        building_id: ID of the building to validate against
+        background_upload: Queue the upload instead of waiting for its response
+        
+    Returns:
+        Response with the ValidationResponse payload, serialized directly by orjson
+    """
+    ocr_result = ocr_cache.get(document_hash)
+    if ocr_result is None:
+        ocr_result = await ocr_service.extract_text(
+            document=content,
+            filename=filename or "unknown",
+            document_hash=document_hash
+        )
+        ocr_cache.set(document_hash, ocr_result)
+    
+    text_hash = content_hash(ocr_result.encode("utf-8"))
+    entities = ner_cache.get(text_hash)
+    if entities is None:
+        entities = await ner_service.extract_entities(text=ocr_result)
+        # NER reports failures as an empty result, so only cache real extractions
+        if entities.responsible_engineer or entities.date or entities.construction_progress_percentage:
+            ner_cache.set(text_hash, entities)
+    
+    is_valid = validation_service.validate_extraction(entities)
+    
+    upload_response = None
+    blockchain_response = None
+    
+    if is_valid and background_upload:
+        # Failures are logged by the upload service; the response leaves upload_response empty
+        await upload_service.schedule_upload(content, filename)
+        blockchain_response = await release_milestone_funds(blockchain_service, building_id)
+    elif is_valid:
+        # Upload and on-chain release are independent, so run them concurrently
+        upload_response, blockchain_response = await asyncio.gather(
+            upload_document(upload_service, content, filename),
+            release_milestone_funds(blockchain_service, building_id)
+        )
+    
+    # Built as a plain dict so the response skips a second pydantic validation pass
+    return ORJSONResponse({
+        "is_valid": is_valid,
+        "extraction": entities.model_dump(),
+        "upload_response": upload_response,
+        "blockchain_response": blockchain_response
+    })
+
+
+@app.post(
+    "/validate",
+    response_class=ORJSONResponse,
+    responses={200: {"model": ValidationResponse}},
+    tags=["Validation"]
+)
 async def validate_document(
     file: UploadFile = File(..., description="PDF or image file to validate"),
     building_id: int = Body(..., description="ID of the building to validate against"),
-    api_key: str = Security(verify_api_key)
-) -> ValidationResponse:
+    background_upload: bool = Query(False, description="Queue the document upload and respond without its upload_response"),
+    ocr_service: OCRService = Depends(get_ocr_service),
+    ner_service: NERService = Depends(get_ner_service),
+    validation_service: ValidationService = Depends(get_validation_service),
+    upload_service: UploadService = Depends(get_upload_service),
+    blockchain_service: Optional[BlockchainService] = Depends(get_blockchain_service)
+) -> ORJSONResponse:
     """
     Validate an uploaded document (PDF or image).
     
@@ -155,6 +425,7 @@ async def validate_document(
     Args:
         file: Uploaded file containing the document
         building_id: ID of the building to validate against
+        background_upload: Queue the upload instead of waiting for its response
         
     Returns:
         ValidationResponse with validation result and extracted entities
@@ -162,62 +433,81 @@ async def validate_document(
     Raises:
         HTTPException: If file processing fails
     """
-    try:
-        content = await file.read()
-        
-        if not content:
-            raise HTTPException(status_code=400, detail="Uploaded file is empty")
-        
-        ocr_result = await ocr_service.extract_text(
-            document=content,
-            filename=file.filename or "unknown"
-        )
-        
-        entities = await ner_service.extract_entities(text=ocr_result)
-        
-        is_valid = validation_service.validate_extraction(entities)
-        
-        upload_response = None
-        blockchain_response = None
-        
-        if is_valid:
-            # Upload file
-            try:
-                upload_response = await upload_service.upload_file(
-                    file_content=content,
-                    filename=file.filename
-                )
-            except RuntimeError as e:
-                print(f"Warning: Failed to upload file: {str(e)}")
-            
-            # Release last milestone funds on blockchain if enabled
-            if blockchain_service:
-                try:
-                    
-                    blockchain_response = blockchain_service.release_milestone_funds(
-                        building_id=building_id
-                    )
-                    print(f"Milestone funds released on blockchain: {blockchain_response['transaction_hash']}")
-                except Exception as e:
-                    print(f"Warning: Failed to release milestone funds on blockchain: {str(e)}")
+    content, document_hash = await read_document(iter_upload(file))
+    
+    return await process_document(
+        content=content,
+        document_hash=document_hash,
+        filename=file.filename,
+        building_id=building_id,
+        ocr_service=ocr_service,
+        ner_service=ner_service,
+        validation_service=validation_service,
+        upload_service=upload_service,
+        blockchain_service=blockchain_service,
+        background_upload=background_upload
+    )
+
+
+@app.post(
+    "/validate-raw",
+    response_class=ORJSONResponse,
+    responses={200: {"model": ValidationResponse}},
+    tags=["Validation"]
+)
+async def validate_document_raw(
+    request: Request,
+    building_id: int = Query(..., description="ID of the building to validate against"),
+    x_filename: str = Header("document", description="Original filename of the document"),
+    background_upload: bool = Query(False, description="Queue the document upload and respond without its upload_response"),
+    ocr_service: OCRService = Depends(get_ocr_service),
+    ner_service: NERService = Depends(get_ner_service),
+    validation_service: ValidationService = Depends(get_validation_service),
+    upload_service: UploadService = Depends(get_upload_service),
+    blockchain_service: Optional[BlockchainService] = Depends(get_blockchain_service)
+) -> ORJSONResponse:
+    """
+    Validate a document sent as the raw request body (application/octet-stream).
+    
+    Same pipeline as /validate, without multipart encoding overhead.
+    
+    Args:
+        request: Request whose body is the document bytes
+        building_id: ID of the building to validate against
+        x_filename: Original filename from the X-Filename header
+        background_upload: Queue the upload instead of waiting for its response
         
-        return ValidationResponse(
-            is_valid=is_valid,
-            extraction=entities,
-            upload_response=upload_response,
-            blockchain_response=blockchain_response
-        )
+    Returns:
+        ValidationResponse with validation result and extracted entities
         
-    except RuntimeError as e:
-        raise HTTPException(status_code=500, detail=str(e))
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to process document: {str(e)}")
+    Raises:
+        HTTPException: If document processing fails
+    """
+    content, document_hash = await read_document(request.stream())
+    
+    return await process_document(
+        content=content,
+        document_hash=document_hash,
+        filename=x_filename,
+        building_id=building_id,
+        ocr_service=ocr_service,
+        ner_service=ner_service,
+        validation_service=validation_service,
+        upload_service=upload_service,
+        blockchain_service=blockchain_service,
+        background_upload=background_upload
+    )
 
 
-@app.get("/blockchain/status", response_model=Dict[str, Any], tags=["Blockchain"])
+@app.get(
+    "/blockchain/status",
+    response_class=ORJSONResponse,
+    responses={200: {"model": Dict[str, Any]}},
+    tags=["Blockchain"]
+)
 async def blockchain_status(
-    api_key: str = Security(verify_api_key)
-) -> Dict[str, Any]:
+    blockchain_service: Optional[BlockchainService] = Depends(get_blockchain_service)
+) -> ORJSONResponse:
     """
     Get blockchain integration status.
     
@@ -228,21 +518,21 @@ async def blockchain_status(
         Dictionary with blockchain status information
     """
     if not blockchain_service:
-        return {
+        return ORJSONResponse({
             "enabled": False,
             "message": "Blockchain integration is not enabled"
-        }
+        })
     
     try:
-        is_connected = blockchain_service.is_connected()
+        is_connected = await blockchain_service.is_connected()
         oracle_address = blockchain_service.get_oracle_address()
 
         oracle_balance = None
         if is_connected and oracle_address:
-            balance_wei = blockchain_service.w3.eth.get_balance(oracle_address)
+            balance_wei = await blockchain_service.w3.eth.get_balance(oracle_address)
             oracle_balance = float(balance_wei) / 10**18  # Convert to ETH
         
-        return {
+        return ORJSONResponse({
             "enabled": True,
             "connected": is_connected,
             "rpc_url": blockchain_service.rpc_url,
@@ -250,11 +540,38 @@ async def blockchain_status(
             "oracle_address": oracle_address,
             "oracle_balance_eth": oracle_balance,
             "chain_id": blockchain_service.chain_id
-        }
+        })
     except Exception as e:
-        return {
+        return ORJSONResponse({
             "enabled": True,
             "connected": False,
             "error": str(e)
-        }
+        })
 
+
+# JSONResponse rather than the orjson default: wei amounts are uint256 and overflow orjson's 64-bit ints
+@app.get(
+    "/blockchain/escrows",
+    response_model=List[EscrowInfoResponse],
+    response_class=JSONResponse,
+    tags=["Blockchain"]
+)
+async def escrow_info(
+    building_ids: List[int] = Query(..., description="IDs of the buildings to look up"),
+    blockchain_service: Optional[BlockchainService] = Depends(get_blockchain_service)
+) -> List[Dict[str, Any]]:
+    """
+    Get escrow information for one or more buildings.
+    
+    All buildings are read in a single Multicall3 call.
+    
+    Returns:
+        Escrow information for each building, in the order requested
+    """
+    if not blockchain_service:
+        raise HTTPException(status_code=503, detail="Blockchain integration is not enabled")
+    
+    if len(building_ids) > MAX_ESCROW_LOOKUPS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_ESCROW_LOOKUPS} buildings can be looked up at once")
+    
+    return await blockchain_service.get_escrow_info_many(building_ids)
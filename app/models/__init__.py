@@ -1,4 +1,4 @@
 """Data models for the application."""
-from app.models.extraction import ExtractionResult
+from app.models.extraction import ExtractionResult, extraction_adapter
 
-__all__ = ["ExtractionResult"]
+__all__ = ["ExtractionResult", "extraction_adapter"]
@@ -1,9 +1,15 @@
 """Extraction result models."""
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict, TypeAdapter
 
 
 class ExtractionResult(BaseModel):
     """Result of entity extraction."""
+    model_config = ConfigDict(frozen=True)
+    
     responsible_engineer: str
     date: str
     construction_progress_percentage: float
+
+
+# Built once so callers don't pay validator construction per use
+extraction_adapter = TypeAdapter(ExtractionResult)
@@ -3,17 +3,191 @@ Blockchain service for interacting with EscrowManager smart contract.
 This service releases milestone funds based on building registry validation.
 """
 
+import asyncio
+import copy
 import logging
-import json
+import time
+from functools import lru_cache
 from pathlib import Path
-from typing import Optional, Dict, Any, List
-from web3 import Web3
-from web3.contract import Contract
+from typing import Awaitable, Callable, Optional, Dict, Any, List, Tuple
+import aiohttp
+import orjson
+from web3 import AsyncWeb3, Web3
+from web3.contract import AsyncContract
 from eth_account import Account
 from eth_account.signers.local import LocalAccount
+from eth_utils import function_abi_to_4byte_selector
 
 logger = logging.getLogger(__name__)
 
+# Multicall3 is deployed at the same address on Ethereum and most EVM chains
+MULTICALL3_ADDRESS = "0xcA11bde05977b3631167028862bE2a173976CA11"
+MULTICALL3_ABI = [
+    {
+        "inputs": [
+            {
+                "components": [
+                    {"internalType": "address", "name": "target", "type": "address"},
+                    {"internalType": "bytes", "name": "callData", "type": "bytes"}
+                ],
+                "internalType": "struct Multicall3.Call[]",
+                "name": "calls",
+                "type": "tuple[]"
+            }
+        ],
+        "name": "aggregate",
+        "outputs": [
+            {"internalType": "uint256", "name": "blockNumber", "type": "uint256"},
+            {"internalType": "bytes[]", "name": "returnData", "type": "bytes[]"}
+        ],
+        "stateMutability": "payable",
+        "type": "function"
+    }
+]
+
+
+@lru_cache(maxsize=32)
+def _load_abi_cached(abi_path: str, mtime: float) -> Tuple[Dict[str, Any], ...]:
+    """
+    Read and parse an ABI file.
+    
+    Args:
+        abi_path: Absolute path to the ABI JSON file
+        mtime: Modification time of the file, part of the cache key
+        
+    Returns:
+        Tuple of ABI definitions
+        
+    Raises:
+        ValueError: If ABI file is invalid JSON
+    """
+    try:
+        with open(abi_path, 'rb') as f:
+            abi = orjson.loads(f.read())
+        
+        # Handle case where ABI is wrapped in an object with an "abi" key
+        if isinstance(abi, dict) and "abi" in abi:
+            abi = abi["abi"]
+        
+        if not isinstance(abi, list):
+            raise ValueError("ABI must be a JSON array")
+        
+        logger.info(f"Successfully loaded ABI from {abi_path}")
+        return tuple(abi)
+        
+    except orjson.JSONDecodeError as e:
+        raise ValueError(f"Invalid JSON in ABI file: {e}")
+
+
+def _build_batch_payload(calls: List[Tuple[str, List[Any]]]) -> List[Dict[str, Any]]:
+    """Build a JSON-RPC batch request body, using each call's position as its id."""
+    return [
+        {"jsonrpc": "2.0", "id": index, "method": method, "params": params}
+        for index, (method, params) in enumerate(calls)
+    ]
+
+
+def _parse_batch_response(calls: List[Tuple[str, List[Any]]], responses: Any) -> List[Any]:
+    """
+    Match a JSON-RPC batch response back to its calls.
+    
+    Raises:
+        RuntimeError: If the batch was rejected or any call failed
+    """
+    if not isinstance(responses, list):
+        raise RuntimeError(f"JSON-RPC batch request rejected: {responses}")
+    
+    by_id = {item.get("id"): item for item in responses}
+    results = []
+    for index, (method, _) in enumerate(calls):
+        item = by_id.get(index)
+        if item is None or "error" in item:
+            error = item.get("error") if item else "missing response"
+            raise RuntimeError(f"JSON-RPC call {method} failed: {error}")
+        results.append(item["result"])
+    
+    return results
+
+
+class TransactionConfirmationManager:
+    """
+    Waits for transaction receipts.
+    
+    All pending transactions are polled together with one batched
+    eth_getTransactionReceipt request per tick, instead of one polling
+    loop per transaction.
+    """
+    
+    def __init__(
+        self,
+        rpc_batch: Callable[[List[Tuple[str, List[Any]]]], Awaitable[List[Any]]],
+        poll_interval: float = 1.0
+    ):
+        """
+        Initialize the confirmation manager.
+        
+        Args:
+            rpc_batch: Coroutine function sending a JSON-RPC batch request
+            poll_interval: Seconds between receipt polls
+        """
+        self._rpc_batch = rpc_batch
+        self.poll_interval = poll_interval
+        self._pending: Dict[str, asyncio.Future] = {}
+        self._poll_task: Optional[asyncio.Task] = None
+    
+    async def confirm(self, tx_hash: str, timeout: float = 120) -> Dict[str, Any]:
+        """
+        Wait for a transaction to be mined.
+        
+        Args:
+            tx_hash: Transaction hash as a hex string
+            timeout: Maximum seconds to wait
+            
+        Returns:
+            Raw JSON-RPC transaction receipt
+            
+        Raises:
+            RuntimeError: If the transaction isn't mined within the timeout
+        """
+        future = self._pending.get(tx_hash)
+        if future is None:
+            future = asyncio.get_running_loop().create_future()
+            self._pending[tx_hash] = future
+        
+        if self._poll_task is None or self._poll_task.done():
+            self._poll_task = asyncio.create_task(self._poll())
+        
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), timeout)
+        except asyncio.TimeoutError:
+            raise RuntimeError(f"Transaction {tx_hash} not mined after {timeout} seconds")
+        finally:
+            self._pending.pop(tx_hash, None)
+    
+    async def _poll(self) -> None:
+        """Poll receipts for all pending transactions until none are left."""
+        while self._pending:
+            await asyncio.sleep(self.poll_interval)
+            
+            tx_hashes = list(self._pending)
+            if not tx_hashes:
+                break
+            
+            try:
+                receipts = await self._rpc_batch(
+                    [("eth_getTransactionReceipt", [tx_hash]) for tx_hash in tx_hashes]
+                )
+            except Exception as e:
+                logger.warning(f"Failed to poll transaction receipts: {e}")
+                continue
+            
+            for tx_hash, receipt in zip(tx_hashes, receipts):
+                if receipt is None:
+                    continue
+                future = self._pending.pop(tx_hash, None)
+                if future is not None and not future.done():
+                    future.set_result(receipt)
+
 
 class BlockchainService:
     """
@@ -21,11 +195,16 @@ class BlockchainService:
     Releases milestone funds based on building registry validation.
     """
     
+    # Seconds a successful connection check is trusted before probing the node again
+    CONNECTION_CHECK_TTL = 5.0
+    
     @staticmethod
     def load_abi(abi_file_path: str) -> List[Dict[str, Any]]:
         """
         Load contract ABI from a JSON file.
         
+        Parsed ABIs are cached until the file's modification time changes.
+        
         Args:
             abi_file_path: Path to the ABI JSON file
             
@@ -36,27 +215,13 @@ class BlockchainService:
             FileNotFoundError: If ABI file doesn't exist
             ValueError: If ABI file is invalid JSON
         """
-        abi_path = Path(abi_file_path)
+        abi_path = Path(abi_file_path).resolve()
         
         if not abi_path.exists():
             raise FileNotFoundError(f"ABI file not found: {abi_file_path}")
         
-        try:
-            with open(abi_path, 'r') as f:
-                abi = json.load(f)
-            
-            # Handle case where ABI is wrapped in an object with an "abi" key
-            if isinstance(abi, dict) and "abi" in abi:
-                abi = abi["abi"]
-            
-            if not isinstance(abi, list):
-                raise ValueError("ABI must be a JSON array")
-            
-            logger.info(f"Successfully loaded ABI from {abi_file_path}")
-            return abi
-            
-        except json.JSONDecodeError as e:
-            raise ValueError(f"Invalid JSON in ABI file: {e}")
+        # Deep copy so callers can't mutate the cached definitions or their nested entries
+        return copy.deepcopy(list(_load_abi_cached(str(abi_path), abi_path.stat().st_mtime)))
     
     def __init__(
         self,
@@ -64,7 +229,9 @@ class BlockchainService:
         contract_address: str,
         abi_file_path: str,
         private_key: Optional[str] = None,
-        chain_id: int = 1
+        chain_id: int = 1,
+        multicall_address: str = MULTICALL3_ADDRESS,
+        max_connections: int = 100
     ):
         """
         Initialize the blockchain service.
@@ -75,6 +242,8 @@ class BlockchainService:
             abi_file_path: Path to the contract ABI JSON file
             private_key: Private key of the oracle account (optional for read-only operations)
             chain_id: Chain ID (1 for mainnet, 11155111 for Sepolia, etc.)
+            multicall_address: Address of the Multicall3 contract used for batched reads
+            max_connections: Maximum number of pooled keep-alive connections to the RPC endpoint
         """
         self.rpc_url = rpc_url
         self.contract_address = Web3.to_checksum_address(contract_address)
@@ -82,15 +251,32 @@ class BlockchainService:
         
         abi = self.load_abi(abi_file_path)
 
-        self.w3 = Web3(Web3.HTTPProvider(rpc_url))
-        
-        if not self.w3.is_connected():
-            raise RuntimeError(f"Failed to connect to Ethereum node at {rpc_url}")
+        self._request_timeout = aiohttp.ClientTimeout(total=30)
+        self.w3 = AsyncWeb3(AsyncWeb3.AsyncHTTPProvider(rpc_url, request_kwargs={"timeout": self._request_timeout}))
+        self._max_connections = max_connections
+        self._session: Optional[aiohttp.ClientSession] = None
+        # Monotonic time of the last successful connection check; None until one succeeds
+        self._last_connected_at: Optional[float] = None
+        self.confirmations = TransactionConfirmationManager(self._rpc_batch)
+        self._nonce_lock = asyncio.Lock()
         
-        self.contract: Contract = self.w3.eth.contract(
+        self.contract: AsyncContract = self.w3.eth.contract(
             address=self.contract_address,
             abi=abi
         )
+        self.multicall = self.w3.eth.contract(
+            address=Web3.to_checksum_address(multicall_address),
+            abi=MULTICALL3_ABI
+        )
+        
+        # Encode releaseMilestoneFunds calldata directly instead of going through build_transaction
+        release_abi = self.contract.get_function_by_name("releaseMilestoneFunds").abi
+        self._release_selector = function_abi_to_4byte_selector(release_abi)
+        self._release_arg_types = [arg["type"] for arg in release_abi["inputs"]]
+        
+        self._escrow_info_types = [
+            output["type"] for output in self.contract.get_function_by_name("getEscrowInfo").abi["outputs"]
+        ]
         
         self.account: Optional[LocalAccount] = None
         if private_key:
@@ -99,7 +285,107 @@ class BlockchainService:
         else:
             logger.warning("Blockchain service initialized without private key (read-only mode)")
     
-    def release_milestone_funds(
+    async def connect(self) -> None:
+        """
+        Open the shared HTTP session and check the connection to the node.
+        
+        Must be called from the running event loop before using the service.
+        
+        Raises:
+            RuntimeError: If the node is unreachable
+        """
+        # One keep-alive session for web3 calls and batch requests alike
+        # Cache DNS for the lifetime of typical keep-alive connections so reconnects skip the lookup
+        connector = aiohttp.TCPConnector(limit=self._max_connections, ttl_dns_cache=300)
+        self._session = aiohttp.ClientSession(connector=connector, timeout=self._request_timeout)
+        await self.w3.provider.cache_async_session(self._session)
+        
+        if not await self.is_connected():
+            await self.close()
+            raise RuntimeError(f"Failed to connect to Ethereum node at {self.rpc_url}")
+    
+    async def close(self) -> None:
+        """Close the shared HTTP session."""
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+    
+    async def _rpc_batch(self, calls: List[Tuple[str, List[Any]]]) -> List[Any]:
+        """
+        Send several JSON-RPC calls in a single HTTP request.
+        
+        Args:
+            calls: List of (method, params) pairs
+            
+        Returns:
+            Results in the same order as calls
+            
+        Raises:
+            RuntimeError: If the batch or any call in it fails
+        """
+        async with self._session.post(self.rpc_url, json=_build_batch_payload(calls)) as response:
+            response.raise_for_status()
+            responses = await response.json(content_type=None)
+        
+        return _parse_batch_response(calls, responses)
+    
+    async def _get_nonce_and_gas_price(self) -> Tuple[int, int]:
+        """
+        Get the oracle account nonce and the current gas price in one round trip.
+        
+        Falls back to separate calls if the node doesn't accept batch requests.
+        
+        Returns:
+            Tuple of (nonce, gas price in wei)
+        """
+        try:
+            nonce, gas_price = await self._rpc_batch([
+                ("eth_getTransactionCount", [self.account.address, "pending"]),
+                ("eth_gasPrice", [])
+            ])
+            return int(nonce, 16), int(gas_price, 16)
+        except Exception as e:
+            logger.warning(f"JSON-RPC batch failed, falling back to separate calls: {e}")
+            return (
+                await self.w3.eth.get_transaction_count(self.account.address, "pending"),
+                await self.w3.eth.gas_price
+            )
+    
+    async def _submit_release(self, building_id: int, gas_limit: int) -> str:
+        """
+        Build, sign and send a releaseMilestoneFunds transaction.
+        
+        Args:
+            building_id: The ID of the building
+            gas_limit: Gas limit for the transaction
+            
+        Returns:
+            Transaction hash as a hex string
+        """
+        # Concurrent releases would otherwise read the same nonce and collide
+        async with self._nonce_lock:
+            nonce, gas_price = await self._get_nonce_and_gas_price()
+            
+            transaction = {
+                'to': self.contract_address,
+                'data': self._release_selector + self.w3.codec.encode(self._release_arg_types, [building_id]),
+                'value': 0,
+                'chainId': self.chain_id,
+                'gas': gas_limit,
+                'gasPrice': gas_price,
+                'nonce': nonce
+            }
+            
+            signed_txn = self.w3.eth.account.sign_transaction(transaction, self.account.key)
+            logger.info(f"signed transaction info: {signed_txn}")
+            
+            tx_hash = await self.w3.eth.send_raw_transaction(signed_txn.rawTransaction)
+        
+        logger.info(f"Funds release transaction sent: {tx_hash.hex()}")
+        
+        return tx_hash.hex()
+    
+    async def release_milestone_funds(
         self,
         building_id: int,
         gas_limit: int = 300000
@@ -123,38 +409,19 @@ class BlockchainService:
             raise RuntimeError("Cannot release funds: private key not configured")
         
         try:
-            nonce = self.w3.eth.get_transaction_count(self.account.address)
-            
-            gas_price = self.w3.eth.gas_price
-            
-            transaction = self.contract.functions.releaseMilestoneFunds(
-                building_id
-            ).build_transaction({
-                'chainId': self.chain_id,
-                'gas': gas_limit,
-                'gasPrice': gas_price,
-                'nonce': nonce,
-                'from': self.account.address
-            })
-            
-            signed_txn = self.w3.eth.account.sign_transaction(transaction, self.account.key)
-            logger.info(f"signed transaction info: {signed_txn}")
+            tx_hash = await self._submit_release(building_id, gas_limit)
             
-            tx_hash = self.w3.eth.send_raw_transaction(signed_txn.rawTransaction)
+            tx_receipt = await self.confirmations.confirm(tx_hash, timeout=120)
             
-            logger.info(f"Funds release transaction sent: {tx_hash.hex()}")
-            
-            tx_receipt = self.w3.eth.wait_for_transaction_receipt(tx_hash, timeout=120)
-            
-            if tx_receipt['status'] == 0:
-                raise RuntimeError(f"Transaction failed: {tx_hash.hex()}")
+            if int(tx_receipt['status'], 16) == 0:
+                raise RuntimeError(f"Transaction failed: {tx_hash}")
             
             logger.info(f"Funds released for building {building_id}")
             
             return {
-                "transaction_hash": tx_hash.hex(),
-                "block_number": tx_receipt['blockNumber'],
-                "gas_used": tx_receipt['gasUsed'],
+                "transaction_hash": tx_hash,
+                "block_number": int(tx_receipt['blockNumber'], 16),
+                "gas_used": int(tx_receipt['gasUsed'], 16),
                 "status": "success"
             }
             
@@ -162,7 +429,7 @@ class BlockchainService:
             logger.error(f"Failed to release funds: {str(e)}")
             raise RuntimeError(f"Failed to release funds on blockchain: {str(e)}")
     
-    def get_escrow_info(self, building_id: int) -> Dict[str, Any]:
+    async def get_escrow_info(self, building_id: int) -> Dict[str, Any]:
         """
         Get escrow information for a building.
         
@@ -176,23 +443,72 @@ class BlockchainService:
             RuntimeError: If contract call fails
         """
         try:
-            result = self.contract.functions.getEscrowInfo(building_id).call()
+            result = await self.contract.functions.getEscrowInfo(building_id).call()
             
-            return {
-                "total_escrowed": result[0],
-                "total_released": result[1],
-                "last_released_milestone": result[2],
-                "total_milestones": result[3],
-                "developer": result[4]
-            }
+            return self._format_escrow_info(result)
             
         except Exception as e:
             logger.error(f"Failed to get escrow info: {str(e)}")
             raise RuntimeError(f"Failed to get escrow info from blockchain: {str(e)}")
     
-    def is_connected(self) -> bool:
-        """Check if connected to the Ethereum network."""
-        return self.w3.is_connected()
+    async def get_escrow_info_many(self, building_ids: List[int]) -> List[Dict[str, Any]]:
+        """
+        Get escrow information for several buildings in a single eth_call via Multicall3.
+        
+        Args:
+            building_ids: The IDs of the buildings
+            
+        Returns:
+            List of escrow information dictionaries, in the order of building_ids
+            
+        Raises:
+            RuntimeError: If the multicall fails
+        """
+        if not building_ids:
+            return []
+        
+        try:
+            calls = [
+                (self.contract_address, self.contract.encodeABI(fn_name="getEscrowInfo", args=[building_id]))
+                for building_id in building_ids
+            ]
+            _, return_data = await self.multicall.functions.aggregate(calls).call()
+            
+            return [
+                self._format_escrow_info(self.w3.codec.decode(self._escrow_info_types, data))
+                for data in return_data
+            ]
+            
+        except Exception as e:
+            logger.error(f"Failed to get escrow info: {str(e)}")
+            raise RuntimeError(f"Failed to get escrow info from blockchain: {str(e)}")
+    
+    @staticmethod
+    def _format_escrow_info(result: Tuple[Any, ...]) -> Dict[str, Any]:
+        """Convert a getEscrowInfo return tuple into a dictionary."""
+        return {
+            "total_escrowed": result[0],
+            "total_released": result[1],
+            "last_released_milestone": result[2],
+            "total_milestones": result[3],
+            "developer": Web3.to_checksum_address(result[4])
+        }
+    
+    async def is_connected(self) -> bool:
+        """
+        Check if connected to the Ethereum network.
+        
+        A successful check is reused for CONNECTION_CHECK_TTL seconds instead of probing the node again.
+        """
+        if (
+            self._last_connected_at is not None
+            and time.monotonic() - self._last_connected_at < self.CONNECTION_CHECK_TTL
+        ):
+            return True
+        
+        connected = await self.w3.is_connected()
+        self._last_connected_at = time.monotonic() if connected else None
+        return connected
     
     def get_oracle_address(self) -> Optional[str]:
         """Get the account address."""
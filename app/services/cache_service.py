@@ -0,0 +1,120 @@
+"""In-process cache for expensive document processing results."""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Generic, Optional, Tuple, TypeVar
+
+from loguru import logger
+
+try:
+    from blake3 import blake3
+except ImportError:
+    blake3 = None
+
+T = TypeVar("T")
+
+
+def content_hash(data: bytes) -> str:
+    """
+    Compute the cache key for a piece of content.
+
+    Args:
+        data: Raw bytes to hash
+
+    Returns:
+        Hex digest identifying the content
+    """
+    hasher = new_content_hasher()
+    hasher.update(data)
+    return hasher.hexdigest()
+
+
+def new_content_hasher():
+    """
+    Create an incremental hasher producing the same keys as content_hash.
+
+    Uses BLAKE3 (SIMD, multi-MB documents hash several times faster) when
+    installed, falling back to SHA1.
+
+    Returns:
+        Hash object to feed with update() and finish with hexdigest()
+    """
+    if blake3 is not None:
+        return blake3()
+    return hashlib.sha1()
+
+
+class ResultCache(Generic[T]):
+    """
+    Bounded LRU cache with per-entry expiration, keyed by content hash.
+
+    Used to skip re-running OCR and NER when the same document is submitted
+    more than once.
+    """
+
+    def __init__(self, name: str, max_entries: int = 256, ttl_seconds: float = 3600.0):
+        """
+        Initialize the cache.
+
+        Args:
+            name: Name used in log messages
+            max_entries: Maximum number of entries kept before evicting the least recently used
+            ttl_seconds: Time in seconds an entry stays valid
+        """
+        self.name = name
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, Tuple[float, T]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[T]:
+        """
+        Get a cached value.
+
+        Args:
+            key: Content hash
+
+        Returns:
+            The cached value, or None if missing or expired
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+
+            self._entries.move_to_end(key)
+
+        logger.debug(f"{self.name} cache hit for {key}")
+        return value
+
+    def set(self, key: str, value: T) -> None:
+        """
+        Store a value in the cache.
+
+        Args:
+            key: Content hash
+            value: Value to cache
+        """
+        if self.max_entries <= 0:
+            return
+
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """Remove all cached entries."""
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
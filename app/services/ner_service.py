@@ -1,11 +1,13 @@
 """NER (Named Entity Recognition) service using LangExtract and Google Gemini."""
+import asyncio
+import contextlib
 import os
 import time
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Set, Tuple
 from loguru import logger
 
 from app.config import settings
-from app.models import ExtractionResult
+from app.models import ExtractionResult, extraction_adapter
 
 try:
     import langextract as lx
@@ -13,6 +15,25 @@ except ImportError:
     lx = None
 
 
+# Returned when extraction fails; safe to share because ExtractionResult is frozen
+EMPTY_EXTRACTION = ExtractionResult(
+    responsible_engineer="",
+    date="",
+    construction_progress_percentage=0.0
+)
+
+# Accepted spellings of a true boolean value
+_TRUTHY = frozenset({"true", "sim", "yes", "1"})
+
+# Converts extracted text to each entity field type
+_COERCERS = {
+    "string": lambda value: value,
+    "float": lambda value: float(value.replace(",", ".")) if value else None,
+    "integer": lambda value: int(value) if value else None,
+    "boolean": lambda value: value.lower() in _TRUTHY if value else None,
+}
+
+
 class NERService:
     """Service for extracting entities from text using LangExtract and Google Gemini."""
     
@@ -37,6 +58,10 @@ class NERService:
         }
     ]
     
+    EXTRACTION_CONTEXT = "construction report"
+    
+    _FIELD_COERCERS = {ed["field_name"]: _COERCERS[ed["field_type"]] for ed in ENTITY_DEFINITIONS}
+    
     def __init__(self):
         """Initialize NER service."""
         if lx is None:
@@ -44,6 +69,104 @@ class NERService:
         
         if settings.langextract_api_key and not os.environ.get('LANGEXTRACT_API_KEY'):
             os.environ['LANGEXTRACT_API_KEY'] = settings.langextract_api_key
+        
+        # The prompt and examples are identical for every request, so build them once
+        self._prompt = self._build_extraction_prompt(self.ENTITY_DEFINITIONS, self.EXTRACTION_CONTEXT)
+        self._examples = self._create_extraction_examples()
+        
+        self._batch_queue: Optional[asyncio.Queue] = None
+        self._batch_worker_task: Optional[asyncio.Task] = None
+        self._batch_tasks: Set[asyncio.Task] = set()
+    
+    async def start(self) -> None:
+        """
+        Start coalescing concurrent requests into batched LangExtract calls.
+        
+        Batching is disabled when NER_BATCH_SIZE is 1 or less.
+        """
+        if settings.ner_batch_size <= 1 or self._batch_worker_task:
+            return
+        
+        self._batch_queue = asyncio.Queue()
+        self._batch_worker_task = asyncio.create_task(self._batch_worker())
+        logger.info(f"NER batching enabled (batch size {settings.ner_batch_size}, max wait {settings.ner_batch_max_wait_ms}ms)")
+    
+    async def stop(self) -> None:
+        """Stop the batch worker and fail any requests still waiting in the queue."""
+        if not self._batch_worker_task:
+            return
+        
+        self._batch_worker_task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await self._batch_worker_task
+        
+        for task in list(self._batch_tasks):
+            task.cancel()
+        
+        while not self._batch_queue.empty():
+            _, future = self._batch_queue.get_nowait()
+            if not future.done():
+                future.set_exception(RuntimeError("NER service is shutting down"))
+        
+        self._batch_queue = None
+        self._batch_worker_task = None
+    
+    async def _batch_worker(self) -> None:
+        """Collect queued requests into batches of up to NER_BATCH_SIZE, waiting at most NER_BATCH_MAX_WAIT_MS."""
+        loop = asyncio.get_running_loop()
+        max_wait = settings.ner_batch_max_wait_ms / 1000
+        
+        while True:
+            batch = []
+            try:
+                batch.append(await self._batch_queue.get())
+                deadline = loop.time() + max_wait
+                
+                while len(batch) < settings.ner_batch_size:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        batch.append(await asyncio.wait_for(self._batch_queue.get(), timeout))
+                    except asyncio.TimeoutError:
+                        break
+            except asyncio.CancelledError:
+                # Cancelled by stop() mid-collection; the requests already taken off the queue would hang
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(RuntimeError("NER service is shutting down"))
+                raise
+            
+            # Keep collecting the next batch while this one is with the model
+            task = asyncio.create_task(self._process_batch(batch))
+            self._batch_tasks.add(task)
+            task.add_done_callback(self._batch_tasks.discard)
+    
+    async def _process_batch(self, batch: List[Tuple[str, asyncio.Future]]) -> None:
+        """
+        Run one batched extraction and resolve the waiting requests.
+        
+        Args:
+            batch: List of (text, future) pairs
+        """
+        try:
+            results = await asyncio.to_thread(self._extract_batch, [text for text, _ in batch])
+        except asyncio.CancelledError:
+            # Cancelled by stop(); don't leave the waiting requests hanging
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(RuntimeError("NER service is shutting down"))
+            raise
+        except Exception as e:
+            results = [e] * len(batch)
+        
+        for (_, future), result in zip(batch, results):
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
     
     def _build_extraction_prompt(
         self,
@@ -116,93 +239,165 @@ Important instructions:
         ]
         return examples
     
-    async def extract_entities(
-        self,
-        text: str
-    ) -> ExtractionResult:
+    def _check_api_key(self) -> None:
         """
-        Extract entities from text.
+        Ensure the LangExtract API key is configured.
         
-        Args:
-            text: Input text to analyze
-            
-        Returns:
-            ExtractionResult object with extracted entities
+        Raises:
+            RuntimeError: If no API key is configured
         """
-        entity_definitions = self.ENTITY_DEFINITIONS
-        extraction_context = "construction report"
-        
         if not os.environ.get('LANGEXTRACT_API_KEY') and not settings.langextract_api_key:
             raise RuntimeError(
                 "LangExtract API key not configured. Please set LANGEXTRACT_API_KEY environment variable. "
                 "Get your API key from https://aistudio.google.com/app/apikey"
             )
+    
+    def _parse_extractions(self, result: Any) -> Tuple[ExtractionResult, int]:
+        """
+        Convert a LangExtract annotated document into an ExtractionResult.
         
+        Args:
+            result: Annotated document returned by LangExtract
+            
+        Returns:
+            Tuple of (ExtractionResult, number of fields extracted)
+        """
+        entity_definitions = self.ENTITY_DEFINITIONS
+        entities = {}
+        fields_extracted = 0
+        
+        if result and hasattr(result, 'extractions'):
+            field_coercers = self._FIELD_COERCERS
+            
+            for extraction in result.extractions:
+                field_name = extraction.extraction_class
+                coerce = field_coercers.get(field_name)
+                if coerce:
+                    value = extraction.extraction_text
+                    
+                    try:
+                        value = coerce(value)
+                    except (ValueError, AttributeError):
+                        pass
+                    
+                    entities[field_name] = value
+                    if value is not None:
+                        fields_extracted += 1
+        
+        for entity_def in entity_definitions:
+            field_name = entity_def["field_name"]
+            if field_name not in entities:
+                if not entity_def.get("required", True):
+                    entities[field_name] = None
+        
+        extraction_result = extraction_adapter.validate_python({
+            "responsible_engineer": entities.get("responsible_engineer") or "",
+            "date": entities.get("date") or "",
+            "construction_progress_percentage": entities.get("construction_progress_percentage") or 0.0
+        })
+        return extraction_result, fields_extracted
+    
+    def _extract_batch(self, texts: List[str]) -> List[ExtractionResult]:
+        """
+        Extract entities from several texts with a single LangExtract call.
+        
+        Args:
+            texts: Input texts to analyze
+            
+        Returns:
+            ExtractionResult for each text, in input order
+        """
         start_time = time.time()
         
         try:
-            prompt = self._build_extraction_prompt(entity_definitions, extraction_context)
-            logger.debug(f"Extraction prompt built for context: {extraction_context}")
+            documents = [
+                lx.data.Document(text=text, document_id=str(index))
+                for index, text in enumerate(texts)
+            ]
+            
+            logger.info(f"Extracting entities from {len(documents)} document(s) using {settings.ner_model_name} via LangExtract...")
+            annotated_documents = lx.extract(
+                text_or_documents=documents,
+                prompt_description=self._prompt,
+                examples=self._examples,
+                model_id=settings.ner_model_name,
+                use_schema_constraints=True,
+            )
             
-            examples = self._create_extraction_examples()
+            by_id = {document.document_id: document for document in annotated_documents}
+            results = [self._parse_extractions(by_id.get(str(index)))[0] for index in range(len(texts))]
             
+            processing_time = time.time() - start_time
+            logger.info(f"Extracted entities for batch of {len(texts)} in {processing_time:.2f}s")
+            
+            return results
+        
+        except Exception as e:
+            logger.error(f"Error extracting entities for batch: {e}", exc_info=True)
+            
+            if len(texts) == 1:
+                return [EMPTY_EXTRACTION]
+            
+            # One bad document must not empty the results of the other coalesced requests
+            logger.info(f"Retrying {len(texts)} batched document(s) individually")
+            return [self._extract_single(text) for text in texts]
+    
+    def _extract_single(self, text: str) -> ExtractionResult:
+        """
+        Extract entities from one text with its own LangExtract call.
+        
+        Args:
+            text: Input text to analyze
+            
+        Returns:
+            ExtractionResult object with extracted entities, empty if extraction fails
+        """
+        start_time = time.time()
+        
+        try:
             logger.info(f"Extracting entities using {settings.ner_model_name} via LangExtract...")
             result = lx.extract(
                 text_or_documents=text,
-                prompt_description=prompt,
-                examples=examples,
+                prompt_description=self._prompt,
+                examples=self._examples,
                 model_id=settings.ner_model_name,
                 use_schema_constraints=True,
             )
             
-            entities = {}
-            fields_extracted = 0
-            
-            if result and hasattr(result, 'extractions'):
-                field_map = {ed["field_name"]: ed for ed in entity_definitions}
-                
-                for extraction in result.extractions:
-                    field_name = extraction.extraction_class
-                    if field_name in field_map:
-                        value = extraction.extraction_text
-                        
-                        field_type = field_map[field_name]["field_type"]
-                        try:
-                            if field_type == "float":
-                                value = float(value.replace(",", ".")) if value else None
-                            elif field_type == "integer":
-                                value = int(value) if value else None
-                            elif field_type == "boolean":
-                                value = value.lower() in ["true", "sim", "yes", "1"] if value else None
-                        except (ValueError, AttributeError):
-                            pass
-                        
-                        entities[field_name] = value
-                        if value is not None:
-                            fields_extracted += 1
-            
-            for entity_def in entity_definitions:
-                field_name = entity_def["field_name"]
-                if field_name not in entities:
-                    if not entity_def.get("required", True):
-                        entities[field_name] = None
+            extraction_result, fields_extracted = self._parse_extractions(result)
             
             processing_time = time.time() - start_time
             
-            logger.info(f"Extracted {fields_extracted}/{len(entity_definitions)} fields in {processing_time:.2f}s")
+            logger.info(f"Extracted {fields_extracted}/{len(self.ENTITY_DEFINITIONS)} fields in {processing_time:.2f}s")
             
-            return ExtractionResult(
-                responsible_engineer=entities.get("responsible_engineer") or "",
-                date=entities.get("date") or "",
-                construction_progress_percentage=entities.get("construction_progress_percentage") or 0.0
-            )
+            return extraction_result
         
         except Exception as e:
-            processing_time = time.time() - start_time
             logger.error(f"Error extracting entities: {e}", exc_info=True)
             
-            return ExtractionResult(
-                responsible_engineer="",
-                date="",
-                construction_progress_percentage=0.0
-            )
+            return EMPTY_EXTRACTION
+    
+    async def extract_entities(
+        self,
+        text: str
+    ) -> ExtractionResult:
+        """
+        Extract entities from text.
+        
+        When batching is running, concurrent calls are coalesced into one LangExtract call.
+        
+        Args:
+            text: Input text to analyze
+            
+        Returns:
+            ExtractionResult object with extracted entities
+        """
+        self._check_api_key()
+        
+        if self._batch_queue is not None:
+            future = asyncio.get_running_loop().create_future()
+            await self._batch_queue.put((text, future))
+            return await future
+        
+        # lx.extract blocks for the whole model round-trip, so keep it off the event loop
+        return await asyncio.to_thread(self._extract_single, text)
@@ -1,17 +1,41 @@
 """OCR (Optical Character Recognition) service using Google Cloud Vision API."""
+import asyncio
 import io
 import os
-import json
+import threading
 import uuid
-from typing import Dict, Any, Optional, List
-from pathlib import Path
+from typing import Optional, List
 
+import orjson
+from google.api_core.exceptions import PreconditionFailed
 from google.cloud import vision
 from google.cloud import storage
 from PIL import Image
 from loguru import logger
 
 from app.config import settings
+from app.exceptions import DocumentProcessingError, InvalidDocumentError
+from app.services.cache_service import content_hash
+
+try:
+    import pypdfium2 as pdfium
+except ImportError:
+    pdfium = None
+
+try:
+    import simdjson
+except ImportError:
+    simdjson = None
+
+# Vision annotates PDFs inline (without GCS) up to these limits
+VISION_INLINE_MAX_PAGES = 5
+VISION_INLINE_MAX_BYTES = 20 * 1024 * 1024
+
+# PDFium is not thread-safe, even across documents, so every pdfium call holds this lock
+_PDFIUM_LOCK = threading.Lock()
+
+# Documents larger than this are sent to GCS as a chunked resumable upload (multiple of 256 KB)
+GCS_UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024
 
 
 class OCRService:
@@ -21,6 +45,8 @@ class OCRService:
         """Initialize OCR service with Google Cloud Vision and Storage clients."""
         self.vision_client = None
         self.storage_client = None
+        # Bounds inline page requests across all documents; created on first use on the running loop
+        self._page_semaphore: Optional[asyncio.Semaphore] = None
         self._initialize_clients()
     
     def _initialize_clients(self):
@@ -37,13 +63,17 @@ class OCRService:
             self.vision_client = None
             self.storage_client = None
     
-    def _upload_to_gcs(self, document: bytes, filename: str) -> str:
+    def _upload_to_gcs(self, document: bytes, document_hash: str) -> str:
         """
-        Upload document to Google Cloud Storage.
+        Upload document to Google Cloud Storage under a content-addressed name.
+        
+        Documents already present in the bucket are not uploaded again. Inputs are not
+        deleted here; the bucket's lifecycle rule expires them, which bounds how long
+        resubmissions are deduplicated (see README).
         
         Args:
             document: Document bytes
-            filename: Original filename
+            document_hash: Content hash of the document
             
         Returns:
             GCS URI (gs://bucket-name/path)
@@ -53,20 +83,30 @@ class OCRService:
         
         try:
             bucket = self.storage_client.bucket(settings.gcs_bucket_name)
-            unique_id = str(uuid.uuid4())
-            blob_name = f"ocr_input/{unique_id}/{filename}"
-            blob = bucket.blob(blob_name)
-            
-            blob.upload_from_string(document)
+            blob_name = f"ocr_input/{document_hash}.pdf"
+            chunk_size = GCS_UPLOAD_CHUNK_SIZE if len(document) > GCS_UPLOAD_CHUNK_SIZE else None
+            blob = bucket.blob(blob_name, chunk_size=chunk_size)
             gcs_uri = f"gs://{settings.gcs_bucket_name}/{blob_name}"
-            logger.info(f"Uploaded document to {gcs_uri}")
+            
+            try:
+                # Generation 0 means "only if absent": one round-trip, and no gap between a check and the upload
+                blob.upload_from_file(
+                    io.BytesIO(document),
+                    size=len(document),
+                    content_type='application/pdf',
+                    checksum='crc32c',
+                    if_generation_match=0
+                )
+                logger.info(f"Uploaded document to {gcs_uri}")
+            except PreconditionFailed:
+                logger.info(f"Document already in GCS at {gcs_uri}, skipping upload")
             
             return gcs_uri
         except Exception as e:
             logger.error(f"Error uploading to GCS: {e}")
             raise RuntimeError(f"Failed to upload to GCS: {str(e)}")
     
-    def _download_from_gcs(self, gcs_uri: str) -> str:
+    def _download_from_gcs(self, gcs_uri: str) -> bytes:
         """
         Download JSON result from Google Cloud Storage.
         
@@ -74,7 +114,7 @@ class OCRService:
             gcs_uri: GCS URI to download from
             
         Returns:
-            JSON content as string
+            Raw JSON content
         """
         if not self.storage_client:
             raise RuntimeError("Google Cloud Storage client not initialized.")
@@ -87,7 +127,7 @@ class OCRService:
             bucket = self.storage_client.bucket(bucket_name)
             blob = bucket.blob(blob_name)
             
-            content = blob.download_as_text()
+            content = blob.download_as_bytes()
             logger.info(f"Downloaded result from {gcs_uri}")
             
             return content
@@ -124,7 +164,27 @@ class OCRService:
             logger.error(f"Error listing blobs from GCS: {e}")
             raise RuntimeError(f"Failed to list blobs from GCS: {str(e)}")
     
-    def _cleanup_gcs_files(self, *gcs_uris: str):
+    def _delete_gcs_files(self, gcs_uris: List[str]):
+        """
+        Delete temporary files from Google Cloud Storage in a single batch request.
+        
+        Files that no longer exist are ignored.
+        
+        Args:
+            gcs_uris: GCS URIs to delete
+        """
+        try:
+            # Deletes are queued and sent as one multipart request when the batch exits
+            with self.storage_client.batch(raise_exception=False):
+                for gcs_uri in gcs_uris:
+                    bucket_name, blob_name = gcs_uri.replace("gs://", "").split("/", 1)
+                    self.storage_client.bucket(bucket_name).blob(blob_name).delete()
+            
+            logger.debug(f"Deleted {len(gcs_uris)} temporary file(s)")
+        except Exception as e:
+            logger.warning(f"Failed to delete temporary files {gcs_uris}: {e}")
+    
+    async def _cleanup_gcs_files(self, *gcs_uris: str):
         """
         Clean up temporary files from Google Cloud Storage.
         
@@ -134,39 +194,53 @@ class OCRService:
         if not self.storage_client:
             return
         
-        for gcs_uri in gcs_uris:
-            try:
-                uri_parts = gcs_uri.replace("gs://", "").split("/", 1)
-                bucket_name = uri_parts[0]
-                blob_name = uri_parts[1]
-                
-                bucket = self.storage_client.bucket(bucket_name)
-                blob = bucket.blob(blob_name)
-                blob.delete()
-                
-                logger.debug(f"Deleted temporary file: {gcs_uri}")
-            except Exception as e:
-                logger.warning(f"Failed to delete temporary file {gcs_uri}: {e}")
+        await asyncio.to_thread(self._delete_gcs_files, list(gcs_uris))
     
-    def _extract_text_from_pdf_async(self, pdf_bytes: bytes, filename: str) -> Dict[str, Any]:
+    def _read_output_page_texts(self, gcs_uri: str) -> List[str]:
+        """
+        Download a Vision output file and read the text of each page in it.
+        
+        With simdjson installed, only the text fields are materialized; the
+        per-symbol layout data is never converted to Python objects.
+        
+        Args:
+            gcs_uri: GCS URI of the output file
+            
+        Returns:
+            Text of each page, empty for pages without text
+        """
+        json_content = self._download_from_gcs(gcs_uri)
+        
+        if simdjson is not None:
+            # Parsers are not thread-safe, so each worker uses its own
+            json_data = simdjson.Parser().parse(json_content)
+        else:
+            json_data = orjson.loads(json_content)
+        
+        return [
+            str(response.get('fullTextAnnotation', {}).get('text', ''))
+            for response in json_data.get('responses', [])
+        ]
+    
+    async def _extract_text_from_pdf_async(self, pdf_bytes: bytes, document_hash: str) -> str:
         """
         Extract text from PDF using Google Cloud Vision API's async batch annotation.
         
         Args:
             pdf_bytes: PDF file as bytes
-            filename: Original filename
+            document_hash: Content hash of the PDF, used as its GCS object name
             
         Returns:
-            Dictionary with extracted text and confidence
+            Extracted text with pages in order
         """
         if not self.vision_client:
             raise RuntimeError("Google Cloud Vision client not initialized. Please check credentials.")
         
-        input_gcs_uri = None
         output_gcs_prefix = None
+        output_blob_names = None
         
         try:
-            input_gcs_uri = self._upload_to_gcs(pdf_bytes, filename)
+            input_gcs_uri = await asyncio.to_thread(self._upload_to_gcs, pdf_bytes, document_hash)
             
             unique_id = str(uuid.uuid4())
             output_gcs_prefix = f"gs://{settings.gcs_bucket_name}/ocr_output/{unique_id}/"
@@ -189,77 +263,220 @@ class OCRService:
             )
             
             logger.info("Starting async batch annotation for PDF")
-            operation = self.vision_client.async_batch_annotate_files(requests=[request])
+            operation = await asyncio.to_thread(self.vision_client.async_batch_annotate_files, requests=[request])
             
             logger.info("Waiting for operation to complete...")
-            result = operation.result(timeout=420)
+            result = await asyncio.to_thread(operation.result, timeout=420)
             
             if not result.responses:
-                raise RuntimeError("No responses found in operation result")
+                raise DocumentProcessingError("No responses found in operation result")
             
             first_response = result.responses[0]
             output_uri = first_response.output_config.gcs_destination.uri
             logger.info(f"Operation completed, results at: {output_uri}")
             
-            blob_names = self._list_gcs_blobs(output_uri)
+            output_blob_names = await asyncio.to_thread(self._list_gcs_blobs, output_uri)
             
-            output_files = [name for name in blob_names if name.endswith('.json')]
+            output_files = [name for name in output_blob_names if name.endswith('.json')]
             output_files.sort()
             logger.info(f"Found {len(output_files)} output file(s): {output_files}")
             
             if not output_files:
-                raise RuntimeError("No output files found in GCS")
+                raise DocumentProcessingError("No output files found in GCS")
             
             all_text_parts = []
-            all_confidences = []
+            append_text = all_text_parts.append
             num_pages = 0
             
-            for output_file in output_files:
-                output_file_uri = f"gs://{settings.gcs_bucket_name}/{output_file}"
-                logger.info(f"Processing output file: {output_file_uri}")
-                
-                json_content = self._download_from_gcs(output_file_uri)
-                json_data = json.loads(json_content)
-                
-                for response in json_data.get('responses', []):
+            # Download and parse all output files concurrently; gather keeps them in page order
+            output_file_uris = [f"gs://{settings.gcs_bucket_name}/{name}" for name in output_files]
+            page_texts_per_file = await asyncio.gather(
+                *(asyncio.to_thread(self._read_output_page_texts, uri) for uri in output_file_uris)
+            )
+            
+            for page_texts in page_texts_per_file:
+                for text in page_texts:
                     num_pages += 1
-                    full_text_annotation = response.get('fullTextAnnotation', {})
-                    
-                    text = full_text_annotation.get('text', '')
                     if text:
-                        all_text_parts.append(text)
-                    
-                    pages = full_text_annotation.get('pages', [])
-                    for page in pages:
-                        blocks = page.get('blocks', [])
-                        for block in blocks:
-                            if 'confidence' in block:
-                                all_confidences.append(block['confidence'])
+                        append_text(text)
             
-            combined_text = "\n\n".join(text for text in all_text_parts if text)
-            avg_confidence = sum(all_confidences) / len(all_confidences) if all_confidences else 0.0
+            combined_text = "\n\n".join(all_text_parts)
             
-            logger.info(f"Extracted text from {num_pages} page(s) with confidence {avg_confidence:.4f}")
+            logger.info(f"Extracted text from {num_pages} page(s)")
             
             return combined_text
         
         except Exception as e:
             logger.error(f"Error in async PDF processing: {e}")
-            raise RuntimeError(f"Failed to process PDF: {str(e)}")
+            raise DocumentProcessingError(f"Failed to process PDF: {str(e)}")
         
         finally:
-            if input_gcs_uri:
-                self._cleanup_gcs_files(input_gcs_uri)
+            # The content-addressed input is kept so resubmissions skip the upload
             if output_gcs_prefix:
                 try:
-                    blob_names = self._list_gcs_blobs(output_gcs_prefix)
+                    # Only list again if processing failed before the outputs were listed
+                    blob_names = output_blob_names
+                    if blob_names is None:
+                        blob_names = await asyncio.to_thread(self._list_gcs_blobs, output_gcs_prefix)
                     output_file_uris = [f"gs://{settings.gcs_bucket_name}/{name}" for name in blob_names]
                     if output_file_uris:
-                        self._cleanup_gcs_files(*output_file_uris)
+                        await self._cleanup_gcs_files(*output_file_uris)
                 except Exception as e:
                     logger.warning(f"Failed to cleanup output files: {e}")
     
-    def _extract_text_from_image(self, image_bytes: bytes) -> Dict[str, Any]:
+    def _count_pdf_pages(self, pdf_bytes: bytes) -> int:
+        """
+        Count the pages of a PDF.
+        
+        Args:
+            pdf_bytes: PDF file as bytes
+            
+        Returns:
+            Number of pages
+            
+        Raises:
+            InvalidDocumentError: If the PDF cannot be parsed
+        """
+        with _PDFIUM_LOCK:
+            try:
+                pdf = pdfium.PdfDocument(pdf_bytes)
+            except pdfium.PdfiumError as e:
+                raise InvalidDocumentError(f"Invalid PDF document: {str(e)}")
+            
+            try:
+                return len(pdf)
+            finally:
+                pdf.close()
+    
+    async def count_pdf_pages(self, pdf_bytes: bytes) -> int:
+        """
+        Count and validate the pages of a PDF without blocking the event loop.
+        
+        Args:
+            pdf_bytes: PDF file as bytes
+            
+        Returns:
+            Number of pages
+            
+        Raises:
+            InvalidDocumentError: If the PDF is invalid or has no pages or too many pages
+        """
+        page_count = await asyncio.to_thread(self._count_pdf_pages, pdf_bytes)
+        
+        if not 1 <= page_count <= settings.ocr_max_pdf_pages:
+            raise InvalidDocumentError(
+                f"PDF must have between 1 and {settings.ocr_max_pdf_pages} pages, got {page_count}"
+            )
+        
+        return page_count
+    
+    def _split_pdf_pages(self, pdf_bytes: bytes) -> List[bytes]:
+        """
+        Split a PDF into single-page PDF documents.
+        
+        Args:
+            pdf_bytes: PDF file as bytes
+            
+        Returns:
+            List of single-page PDFs in page order
+        """
+        with _PDFIUM_LOCK:
+            pdf = pdfium.PdfDocument(pdf_bytes)
+            try:
+                pages = []
+                for index in range(len(pdf)):
+                    page_pdf = pdfium.PdfDocument.new()
+                    try:
+                        page_pdf.import_pages(pdf, [index])
+                        buffer = io.BytesIO()
+                        page_pdf.save(buffer)
+                        pages.append(buffer.getvalue())
+                    finally:
+                        page_pdf.close()
+                
+                return pages
+            finally:
+                pdf.close()
+    
+    def _extract_text_from_pdf_page(self, page_bytes: bytes) -> str:
+        """
+        Extract text from a small PDF using Google Cloud Vision API's inline file annotation.
+        
+        Handles PDFs of up to VISION_INLINE_MAX_PAGES pages in a single request.
+        
+        Args:
+            page_bytes: PDF as bytes
+            
+        Returns:
+            Extracted text as string
+        """
+        if not self.vision_client:
+            raise RuntimeError("Google Cloud Vision client not initialized. Please check credentials.")
+        
+        try:
+            feature = vision.Feature(type_=vision.Feature.Type.DOCUMENT_TEXT_DETECTION)
+            request = vision.AnnotateFileRequest(
+                input_config=vision.InputConfig(content=page_bytes, mime_type='application/pdf'),
+                features=[feature]
+            )
+            
+            response = self.vision_client.batch_annotate_files(requests=[request])
+            file_response = response.responses[0]
+            
+            if file_response.error.message:
+                raise DocumentProcessingError(f"Google Cloud Vision API error: {file_response.error.message}")
+            
+            text_parts = []
+            for page_response in file_response.responses:
+                if page_response.error.message:
+                    raise DocumentProcessingError(f"Google Cloud Vision API error: {page_response.error.message}")
+                if page_response.full_text_annotation and page_response.full_text_annotation.text:
+                    text_parts.append(page_response.full_text_annotation.text)
+            
+            return "\n\n".join(text_parts)
+        
+        except Exception as e:
+            logger.error(f"Error extracting text from PDF page: {e}")
+            raise DocumentProcessingError(f"Failed to extract text from PDF page: {str(e)}")
+    
+    async def extract_page(self, page_bytes: bytes) -> str:
+        """
+        Extract text from a small PDF without blocking the event loop.
+        
+        Args:
+            page_bytes: PDF of up to VISION_INLINE_MAX_PAGES pages as bytes
+            
+        Returns:
+            Extracted text as string
+        """
+        return await asyncio.to_thread(self._extract_text_from_pdf_page, page_bytes)
+    
+    async def _extract_text_from_pdf_pages(self, pdf_bytes: bytes) -> str:
+        """
+        Extract text from a PDF by OCR-ing its pages concurrently.
+        
+        Args:
+            pdf_bytes: PDF file as bytes
+            
+        Returns:
+            Extracted text with pages in order
+        """
+        pages = await asyncio.to_thread(self._split_pdf_pages, pdf_bytes)
+        
+        logger.info(f"Processing {len(pages)} PDF page(s) with up to {settings.ocr_page_concurrency} concurrent requests")
+        if self._page_semaphore is None:
+            self._page_semaphore = asyncio.Semaphore(settings.ocr_page_concurrency)
+        semaphore = self._page_semaphore
+        
+        async def extract(page_bytes: bytes) -> str:
+            async with semaphore:
+                return await self.extract_page(page_bytes)
+        
+        texts = await asyncio.gather(*(extract(page_bytes) for page_bytes in pages))
+        
+        return "\n\n".join(text for text in texts if text)
+    
+    def _extract_text_from_image(self, image_bytes: bytes) -> str:
         """
         Extract text from a single image using Google Cloud Vision API.
         
@@ -267,7 +484,7 @@ class OCRService:
             image_bytes: Image file as bytes
             
         Returns:
-            Dictionary with extracted text and confidence
+            Extracted text as string
         """
         if not self.vision_client:
             raise RuntimeError("Google Cloud Vision client not initialized. Please check credentials.")
@@ -277,41 +494,29 @@ class OCRService:
             response = self.vision_client.document_text_detection(image=image)
             
             if response.error.message:
-                raise Exception(f"Google Cloud Vision API error: {response.error.message}")
+                raise DocumentProcessingError(f"Google Cloud Vision API error: {response.error.message}")
             
             text = response.full_text_annotation.text if response.full_text_annotation else ""
             
-            confidence = 0.0
-            if response.full_text_annotation and response.full_text_annotation.pages:
-                total_confidence = 0.0
-                block_count = 0
-                
-                for page in response.full_text_annotation.pages:
-                    for block in page.blocks:
-                        if hasattr(block, 'confidence'):
-                            total_confidence += block.confidence
-                            block_count += 1
-                
-                if block_count > 0:
-                    confidence = total_confidence / block_count
-            
             return text
         
         except Exception as e:
             logger.error(f"Error extracting text from image: {e}")
-            raise RuntimeError(f"Failed to extract text: {str(e)}")
+            raise DocumentProcessingError(f"Failed to extract text: {str(e)}")
     
     async def extract_text(
         self,
         document: bytes,
-        filename: str = ""
-    ) -> Dict[str, Any]:
+        filename: str = "",
+        document_hash: Optional[str] = None
+    ) -> str:
         """
         Extract text from a document (PDF or image) using Google Cloud Vision API.
         
         Args:
             document: Raw document bytes (PDF or image)
             filename: Original filename to determine file type
+            document_hash: Content hash of the document, computed if not given
             
         Returns:
             Extracted text as string
@@ -320,15 +525,26 @@ class OCRService:
             raise RuntimeError("Google Cloud Vision client not initialized. Please check credentials.")
         
         try:
-            file_ext = Path(filename).suffix.lower() if filename else ""
-            is_pdf = file_ext == ".pdf" or document[:4] == b'%PDF'
+            # Magic bytes first; the extension covers PDFs with leading junk before the header
+            is_pdf = document.startswith(b'%PDF') or filename.lower().endswith(".pdf")
             
             if is_pdf:
+                if pdfium is not None:
+                    page_count = await self.count_pdf_pages(document)
+                    if page_count <= VISION_INLINE_MAX_PAGES and len(document) <= VISION_INLINE_MAX_BYTES:
+                        logger.info(f"Processing {page_count}-page PDF with a single inline annotation")
+                        return await self.extract_page(document)
+                    if page_count <= settings.ocr_parallel_max_pages:
+                        return await self._extract_text_from_pdf_pages(document)
+                
                 logger.info("Processing PDF document with async batch annotation")
-                return self._extract_text_from_pdf_async(document, filename)
+                return await self._extract_text_from_pdf_async(
+                    document,
+                    document_hash or content_hash(document)
+                )
             else:
                 logger.info("Processing image document")
-                return self._extract_text_from_image(document)
+                return await asyncio.to_thread(self._extract_text_from_image, document)
         
         except Exception as e:
             logger.error(f"Error in extract_text: {e}")
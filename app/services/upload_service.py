@@ -1,88 +1,494 @@
+import asyncio
 import base64
+import contextlib
+import gzip
 import httpx
+import io
 import logging
-from typing import Optional
+import orjson
+import secrets
+from typing import AsyncIterator, BinaryIO, Callable, List, Optional, Set, Tuple, Union
 from app.config import settings
 
+try:
+    import pybase64
+except ImportError:
+    pybase64 = None
+
 logger = logging.getLogger(__name__)
 
+# Responses worth retrying: rate limiting and transient server errors
+RETRYABLE_STATUS_CODES = frozenset({429, 500, 502, 503, 504})
+
+# Characters of an error response body kept in log messages and errors
+MAX_LOGGED_ERROR_BODY = 1000
+
+# Larger payloads are base64-encoded and compressed in a worker thread instead of on the event loop
+ENCODE_IN_THREAD_MIN_BYTES = 1024 * 1024
+
+# Base64 encoder producing bytes; pybase64's SIMD encoder when installed
+_b64encode = pybase64.b64encode if pybase64 is not None else base64.b64encode
+
 
 class UploadService:
     
-    def __init__(self):
+    def __init__(self, http_client: Optional[httpx.AsyncClient] = None):
         # Set timeout to 5 minutes for large file uploads
         self.timeout = settings.upload_service_timeout or 300.0
-        logger.info(f"UploadService initialized with timeout: {self.timeout}s")
+        # Reuse pooled connections across uploads instead of a TLS handshake per call
+        self._owns_http_client = http_client is None
+        self.http_client = http_client or httpx.AsyncClient(
+            timeout=self.timeout,
+            http2=settings.upload_service_http2,
+            limits=httpx.Limits(
+                max_connections=settings.http_max_connections,
+                max_keepalive_connections=settings.http_max_keepalive_connections
+            )
+        )
+        
+        # Settings don't change at runtime, so resolve the URL and headers once
+        self._url = settings.upload_service_url
+        self._headers = {}
+        if settings.upload_service_api_key:
+            self._headers["X-API-Key"] = settings.upload_service_api_key
+        else:
+            logger.warning("No API key configured for upload service")
+        if not self._url:
+            logger.warning("Upload service URL not configured; uploads will fail")
+        self._json_headers = {**self._headers, "Content-Type": "application/json"}
+        self._gzip_json_headers = {**self._json_headers, "Content-Encoding": "gzip"}
+        
+        self._upload_queue: Optional[asyncio.Queue] = None
+        self._upload_workers: List[asyncio.Task] = []
+        # Uploads scheduled without workers; referenced here so they aren't garbage-collected mid-upload
+        self._upload_tasks: Set[asyncio.Task] = set()
+        logger.info("UploadService initialized with timeout: %ss", self.timeout)
     
-    async def upload_file(
+    async def start(self) -> None:
+        """
+        Start the background workers that send uploads queued with schedule_upload.
+        
+        Only needed by callers of schedule_upload; pair with stop() on shutdown.
+        """
+        if self._upload_workers or settings.upload_background_workers <= 0:
+            return
+        
+        self._upload_queue = asyncio.Queue()
+        self._upload_workers = [
+            asyncio.create_task(self._upload_worker())
+            for _ in range(settings.upload_background_workers)
+        ]
+        logger.info("Started %d background upload worker(s)", len(self._upload_workers))
+    
+    async def stop(self) -> None:
+        """Stop the background workers and fail any uploads still waiting in the queue."""
+        for task in list(self._upload_tasks):
+            task.cancel()
+        
+        if not self._upload_workers:
+            return
+        
+        for worker in self._upload_workers:
+            worker.cancel()
+        for worker in self._upload_workers:
+            with contextlib.suppress(asyncio.CancelledError):
+                await worker
+        
+        while not self._upload_queue.empty():
+            _, _, future = self._upload_queue.get_nowait()
+            if not future.done():
+                future.set_exception(RuntimeError("Upload service is shutting down"))
+        
+        self._upload_queue = None
+        self._upload_workers = []
+    
+    async def aclose(self) -> None:
+        """Close the HTTP client if this service created it; a shared client is closed by its owner."""
+        if self._owns_http_client:
+            await self.http_client.aclose()
+    
+    async def _upload_worker(self) -> None:
+        """Send queued uploads one at a time and resolve their futures."""
+        while True:
+            file_content, filename, future = await self._upload_queue.get()
+            if future.done():
+                continue
+            
+            try:
+                result = await self.upload_file(file_content, filename)
+            except asyncio.CancelledError:
+                # Cancelled by stop() mid-upload; don't leave the caller's future pending
+                if not future.done():
+                    future.set_exception(RuntimeError("Upload service is shutting down"))
+                raise
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+            else:
+                if not future.done():
+                    future.set_result(result)
+    
+    async def schedule_upload(
         self,
         file_content: bytes,
         filename: Optional[str] = None
-    ) -> dict:
-        logger.info(f"Starting file upload. Filename: {filename}, Size: {len(file_content)} bytes")
+    ) -> asyncio.Future:
+        """
+        Queue a file for upload in the background and return without waiting for it.
+        
+        Without running workers the upload starts as its own task instead.
+        
+        Args:
+            file_content: File content to upload
+            filename: Original filename
+            
+        Returns:
+            Future resolving to the upload service response; failures are already logged
+            by upload_file, so callers may ignore it
+        """
+        if self._upload_queue is None:
+            future = asyncio.create_task(self.upload_file(file_content, filename))
+            self._upload_tasks.add(future)
+            future.add_done_callback(self._upload_tasks.discard)
+        else:
+            future = asyncio.get_running_loop().create_future()
+            await self._upload_queue.put((file_content, filename, future))
         
-        if not settings.upload_service_url:
+        # Mark the outcome as retrieved so ignored failures don't warn again on garbage collection
+        future.add_done_callback(lambda done: done.cancelled() or done.exception())
+        return future
+    
+    def _check_configured(self) -> None:
+        """
+        Ensure the upload service URL is configured.
+        
+        Raises:
+            RuntimeError: If UPLOAD_SERVICE_URL is not set
+        """
+        if not self._url:
             logger.error("Upload service URL not configured")
             raise RuntimeError(
                 "Upload service URL not configured. "
                 "Please set UPLOAD_SERVICE_URL environment variable."
             )
+    
+    async def upload_file(
+        self,
+        file_content: bytes,
+        filename: Optional[str] = None,
+        parse_response: bool = True
+    ) -> Optional[dict]:
+        """
+        Upload a file to the upload service.
         
-        logger.debug("Encoding file content to base64")
-        file_base64 = base64.b64encode(file_content).decode('utf-8')
-        logger.debug(f"Base64 encoded size: {len(file_base64)} characters")
+        Args:
+            file_content: File content to upload
+            filename: Original filename
+            parse_response: Whether to decode the response body; pass False when only success matters
+            
+        Returns:
+            Upload service response, or None if parse_response is False
+        """
+        logger.info("Starting file upload. Filename: %s, Size: %d bytes", filename, len(file_content))
         
-        payload = {
-            "file": file_base64
-        }
+        self._check_configured()
+        headers = self._headers
         
-        if filename:
-            payload["filename"] = filename
+        if settings.upload_service_multipart:
+            # Raw bytes in a multipart body: no base64 pass and a third fewer bytes on the wire
+            request_kwargs = {
+                "files": {"file": (filename or "upload.bin", file_content, "application/octet-stream")}
+            }
+        else:
+            if len(file_content) >= ENCODE_IN_THREAD_MIN_BYTES:
+                file_base64 = await asyncio.to_thread(_b64encode, file_content)
+            else:
+                file_base64 = _b64encode(file_content)
+            
+            # Base64 needs no JSON escaping, so the body is framed around the encoded bytes
+            # directly instead of round-tripping through str; it is reused as-is on retries
+            headers = self._json_headers
+            body = self._build_json_body(file_base64, filename)
+            # Only this frame references the base64 copy; free it before the POST and its retries
+            del file_base64
+            
+            if settings.upload_service_gzip:
+                # Base64 text compresses well; level 1 keeps the CPU cost low
+                if len(body) >= ENCODE_IN_THREAD_MIN_BYTES:
+                    body = await asyncio.to_thread(gzip.compress, body, 1)
+                else:
+                    body = gzip.compress(body, 1)
+                headers = self._gzip_json_headers
+            
+            request_kwargs = {"content": body}
         
-        headers = {
-            "Content-Type": "application/json"
-        }
+        return await self._post(filename, headers, parse_response=parse_response, **request_kwargs)
+    
+    @staticmethod
+    def _build_json_body(file_base64: bytes, filename: Optional[str]) -> bytes:
+        """
+        Build the JSON upload body around already base64-encoded content.
         
-        if settings.upload_service_api_key:
-            headers["X-API-Key"] = settings.upload_service_api_key
-            logger.debug("API key included in request headers")
+        Args:
+            file_base64: Base64-encoded file content
+            filename: Original filename, included when given
+            
+        Returns:
+            JSON body as bytes
+        """
+        filename_field = b',"filename":' + orjson.dumps(filename) if filename else b''
+        return b''.join((b'{"file":"', file_base64, b'"', filename_field, b'}'))
+    
+    async def upload_many(
+        self,
+        files: List[Tuple[bytes, Optional[str]]],
+        max_concurrency: Optional[int] = None
+    ) -> List[Union[dict, Exception]]:
+        """
+        Upload several files concurrently.
+        
+        Args:
+            files: List of (file_content, filename) pairs
+            max_concurrency: Maximum uploads in flight, defaults to UPLOAD_MAX_CONCURRENCY
+            
+        Returns:
+            Upload service response, or the raised exception, for each file in input order
+        """
+        semaphore = asyncio.Semaphore(max_concurrency or settings.upload_max_concurrency)
+        
+        async def upload(file_content: bytes, filename: Optional[str]) -> dict:
+            async with semaphore:
+                return await self.upload_file(file_content, filename)
+        
+        return await asyncio.gather(
+            *(upload(file_content, filename) for file_content, filename in files),
+            return_exceptions=True
+        )
+    
+    async def upload_stream(
+        self,
+        file: BinaryIO,
+        filename: Optional[str] = None,
+        parse_response: bool = True
+    ) -> Optional[dict]:
+        """
+        Upload a file by streaming it from a binary file object.
+        
+        The file is read in UPLOAD_READ_CHUNK_SIZE pieces in a worker thread and sent chunk by
+        chunk, so memory use does not grow with the file size and the event loop never blocks
+        on file I/O. Seekable files are sent with a Content-Length and rewound on retries;
+        other files are sent chunked and tried once. UPLOAD_SERVICE_GZIP does not apply here;
+        use upload_file for content already in memory.
+        
+        Args:
+            file: Binary file object, positioned at the start of the content
+            filename: Original filename
+            parse_response: Whether to decode the response body; pass False when only success matters
+            
+        Returns:
+            Upload service response, or None if parse_response is False
+        """
+        logger.info("Starting streamed file upload. Filename: %s", filename)
+        
+        self._check_configured()
+        
+        size = None
+        if file.seekable():
+            start = file.tell()
+            size = file.seek(0, io.SEEK_END) - start
+            file.seek(start)
+        
+        if settings.upload_service_multipart:
+            boundary = secrets.token_hex(16)
+            head, tail = self._multipart_frame(boundary, filename)
+            headers = {**self._headers, "Content-Type": f"multipart/form-data; boundary={boundary}"}
+            
+            def make_body() -> AsyncIterator[bytes]:
+                return self._iter_multipart_body(file, head, tail)
+            
+            if size is not None:
+                size += len(head) + len(tail)
         else:
-            logger.warning("No API key configured for upload service")
+            headers = self._json_headers
+            
+            def make_body() -> AsyncIterator[bytes]:
+                return self._iter_json_body(file, filename)
+            
+            if size is not None:
+                filename_field = b',"filename":' + orjson.dumps(filename) if filename else b''
+                size = len(b'{"file":""}') + len(filename_field) + (size + 2) // 3 * 4
+        
+        if size is None:
+            # A consumed stream cannot be sent again, so unseekable uploads are not retried
+            return await self._post(filename, headers, attempts=1, parse_response=parse_response, content=make_body())
+        
+        def rewind_body() -> AsyncIterator[bytes]:
+            file.seek(start)
+            return make_body()
+        
+        headers = {**headers, "Content-Length": str(size)}
+        return await self._post(filename, headers, parse_response=parse_response, make_content=rewind_body)
+    
+    @staticmethod
+    def _multipart_frame(boundary: str, filename: Optional[str]) -> Tuple[bytes, bytes]:
+        """
+        Build the multipart/form-data framing around a single file field.
+        
+        Args:
+            boundary: Multipart boundary
+            filename: Original filename, defaults to upload.bin
+            
+        Returns:
+            The bytes sent before and after the file content
+        """
+        # Quotes and line breaks would end the header parameter early; escape them as browsers do
+        quoted = (filename or "upload.bin").replace('"', "%22").replace("\r", "%0D").replace("\n", "%0A")
+        head = (
+            f'--{boundary}\r\n'
+            f'Content-Disposition: form-data; name="file"; filename="{quoted}"\r\n'
+            'Content-Type: application/octet-stream\r\n\r\n'
+        ).encode()
+        tail = f'\r\n--{boundary}--\r\n'.encode()
+        return head, tail
+    
+    async def _iter_multipart_body(self, file: BinaryIO, head: bytes, tail: bytes) -> AsyncIterator[bytes]:
+        """
+        Produce the multipart upload body from a file object, one chunk at a time.
+        
+        Args:
+            file: Binary file object to read
+            head: Multipart framing sent before the content
+            tail: Multipart framing sent after the content
+            
+        Yields:
+            Consecutive pieces of the multipart body
+        """
+        yield head
+        while chunk := await asyncio.to_thread(file.read, settings.upload_read_chunk_size):
+            yield chunk
+        yield tail
+    
+    async def _iter_json_body(self, file: BinaryIO, filename: Optional[str]) -> AsyncIterator[bytes]:
+        """
+        Produce the base64 JSON upload body from a file object, one chunk at a time.
+        
+        Args:
+            file: Binary file object to read
+            filename: Original filename, included in the body when given
+            
+        Yields:
+            Consecutive pieces of the JSON body
+        """
+        # Encode whole 3-byte groups so no padding appears mid-stream
+        chunk_size = max(settings.upload_read_chunk_size // 3 * 3, 3)
+        
+        # One read buffer per stream, refilled in place instead of allocating every chunk
+        buffer = memoryview(bytearray(chunk_size))
+        filled = 0
         
         try:
-            logger.info(f"Sending POST request to {settings.upload_service_url}")
-            async with httpx.AsyncClient(timeout=self.timeout) as client:
-                response = await client.post(
-                    settings.upload_service_url,
-                    json=payload,
-                    headers=headers
-                )
+            yield b'{"file":"'
+            while read := await asyncio.to_thread(file.readinto, buffer[filled:]):
+                filled += read
+                cut = filled - filled % 3
+                yield _b64encode(buffer[:cut])
                 
-                logger.debug(f"Received response with status code: {response.status_code}")
-                response.raise_for_status()
+                # Carry the incomplete 3-byte group over to the start of the buffer
+                buffer[:filled - cut] = buffer[cut:filled]
+                filled -= cut
+            yield _b64encode(buffer[:filled]) + b'"'
+        finally:
+            buffer.release()
+        
+        if filename:
+            yield b',"filename":' + orjson.dumps(filename)
+        yield b'}'
+    
+    async def _post(
+        self,
+        filename: Optional[str],
+        headers: dict,
+        attempts: Optional[int] = None,
+        parse_response: bool = True,
+        make_content: Optional[Callable[[], AsyncIterator[bytes]]] = None,
+        **request_kwargs
+    ) -> Optional[dict]:
+        """
+        Send an upload request and return the parsed response.
+        
+        Connection errors and retryable status codes are retried with exponential backoff,
+        reusing the already encoded body or asking make_content for a fresh stream.
+        
+        Args:
+            filename: Original filename, used in log messages
+            headers: Request headers
+            attempts: Maximum number of attempts, defaults to UPLOAD_RETRY_ATTEMPTS;
+                use 1 for bodies that cannot be replayed
+            parse_response: Whether to decode the response body
+            make_content: Called before each attempt to produce a streamed body
+            request_kwargs: Body arguments for httpx (json, files or content)
+            
+        Returns:
+            Upload service response, or None if parse_response is False
+            
+        Raises:
+            RuntimeError: If the request fails or the service returns an error status
+        """
+        attempts = max(attempts or settings.upload_retry_attempts, 1)
+        
+        try:
+            for attempt in range(1, attempts + 1):
+                logger.info("Sending POST request to %s", self._url)
+                if make_content is not None:
+                    request_kwargs["content"] = make_content()
+                try:
+                    response = await self.http_client.post(
+                        self._url,
+                        headers=headers,
+                        timeout=self.timeout,
+                        **request_kwargs
+                    )
+                except httpx.RequestError as e:
+                    if attempt == attempts:
+                        raise
+                    logger.warning("Upload attempt %d/%d failed - %s: %s", attempt, attempts, type(e).__name__, e)
+                else:
+                    if response.status_code not in RETRYABLE_STATUS_CODES or attempt == attempts:
+                        break
+                    logger.warning("Upload attempt %d/%d returned HTTP status %d", attempt, attempts, response.status_code)
                 
-                result = response.json()
-                logger.info(f"File uploaded successfully. Response: {result}")
-                return result
+                await asyncio.sleep(settings.upload_retry_backoff_seconds * 2 ** (attempt - 1))
+            
+            logger.debug("Received response with status code: %d", response.status_code)
+            response.raise_for_status()
+            
+            logger.info("File uploaded successfully. Filename: %s", filename)
+            if not parse_response:
+                return None
+            
+            result = orjson.loads(response.content)
+            logger.debug("Upload response keys: %s", list(result) if isinstance(result, dict) else type(result).__name__)
+            return result
                 
         except httpx.HTTPStatusError as e:
-            error_msg = f"Upload failed with HTTP status {e.response.status_code}: {e.response.text}"
+            # Error pages can be large; keep only the start of the body
+            error_msg = f"Upload failed with HTTP status {e.response.status_code}: {e.response.text[:MAX_LOGGED_ERROR_BODY]}"
             logger.error(error_msg)
-            logger.error(f"Request URL: {settings.upload_service_url}")
-            logger.error(f"Filename: {filename}")
+            logger.error("Request URL: %s", self._url)
+            logger.error("Filename: %s", filename)
             raise RuntimeError(error_msg)
         except httpx.RequestError as e:
             error_msg = f"Upload request failed - {type(e).__name__}: {str(e)}"
             logger.error(error_msg)
-            logger.error(f"Request URL: {settings.upload_service_url}")
-            logger.error(f"Filename: {filename}")
-            logger.error(f"Error type: {type(e).__module__}.{type(e).__name__}")
-            logger.error(f"Full error details: {repr(e)}", exc_info=True)
+            logger.error("Request URL: %s", self._url)
+            logger.error("Filename: %s", filename)
+            logger.error("Error type: %s.%s", type(e).__module__, type(e).__name__)
+            logger.error("Full error details: %r", e, exc_info=True)
             raise RuntimeError(error_msg)
         except Exception as e:
             error_msg = f"Unexpected error during upload - {type(e).__name__}: {str(e)}"
             logger.error(error_msg)
-            logger.error(f"Request URL: {settings.upload_service_url}")
-            logger.error(f"Filename: {filename}")
-            logger.error(f"Full traceback:", exc_info=True)
+            logger.error("Request URL: %s", self._url)
+            logger.error("Filename: %s", filename)
+            logger.error("Full traceback:", exc_info=True)
             raise RuntimeError(error_msg)
@@ -1,11 +1,16 @@
 from app.models.extraction import ExtractionResult
 
 
+# Accepted construction progress range, in percent
+MIN_PROGRESS_PERCENTAGE = 30.0
+MAX_PROGRESS_PERCENTAGE = 100.0
+
+
 class ValidationService:
+    """Stateless checks on extraction results; callable on the class or an instance."""
 
-    def validate_extraction(self, 
-                            extraction_result: ExtractionResult
-    ) -> bool:
+    @staticmethod
+    def validate_extraction(extraction_result: ExtractionResult) -> bool:
         """
         Validate the extracted entities.
 
@@ -15,13 +20,8 @@ class ValidationService:
         Returns:
             True if all required fields are valid, False otherwise.
         """
-        if not extraction_result.responsible_engineer:
-            return False
-        
-        if not extraction_result.date:
-            return False
-        
-        if not (30.0 <= extraction_result.construction_progress_percentage <= 100.0):
-            return False
-        
-        return True
+        return bool(
+            extraction_result.responsible_engineer
+            and extraction_result.date
+            and MIN_PROGRESS_PERCENTAGE <= extraction_result.construction_progress_percentage <= MAX_PROGRESS_PERCENTAGE
+        )